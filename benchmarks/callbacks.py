@@ -0,0 +1,257 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+# calls every page's callbacks directly, the way dash would for a request, against a snapshot built from the
+# fixture data source, and reports latency percentiles and allocations per callback. nothing touches the network,
+# and the data, inputs and case names are the same on every run so results from different commits can be compared
+#
+#     python benchmarks/callbacks.py                      # writes benchmarks/results/<commit>.json
+#     python benchmarks/callbacks.py --compare benchmarks/results/<other commit>.json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS = os.path.join(ROOT, 'benchmarks', 'results')
+
+# what each page opens on: its callback prefix, the id prefix, the default x/y/z categories, the x category an axis
+# change switches to, any extra scatter inputs and the player selected on load
+PAGES = {
+    'home': {'prefix': '', 'ids': '', 'axes': ('games', 'fantasy_points', 'fantasy_points_ppr'),
+             'other_axis': 'receiving_yards', 'extra': ('RB',), 'player': 'Derrick Henry'},
+    'qb': {'prefix': 'qb_', 'ids': 'qb-', 'axes': ('completions', 'passing_tds', 'fantasy_points_ppr'),
+           'other_axis': 'passing_yards', 'extra': (), 'player': 'Patrick Mahomes'},
+    'rb': {'prefix': 'rb_', 'ids': 'rb-', 'axes': ('carries', 'rushing_tds', 'fantasy_points_ppr'),
+           'other_axis': 'rushing_yards', 'extra': (), 'player': 'Josh Jacobs'},
+    'wr': {'prefix': 'wr_', 'ids': 'wr-', 'axes': ('receptions', 'receiving_tds', 'fantasy_points_ppr'),
+           'other_axis': 'receiving_yards', 'extra': (), 'player': 'Justin Jefferson'},
+    'te': {'prefix': 'te_', 'ids': 'te-', 'axes': ('receptions', 'receiving_tds', 'fantasy_points_ppr'),
+           'other_axis': 'receiving_yards', 'extra': (), 'player': 'Travis Kelce'},
+}
+
+
+def setup(snapshot_dir, source, years):
+    # build a snapshot from the fixture source and load every page from it, as a worker would. the season simulation
+    # is on, and its background callback is called directly too, not through the job manager
+    os.environ.update({'FF_SNAPSHOT_DIR': snapshot_dir, 'FF_WARM_UP': '0', 'FF_REFRESH_INTERVAL': '0',
+                       'FF_BACKGROUND_JOBS': '0', 'FF_SIMULATION': '1'})
+    os.environ.pop('FF_DISK_CACHE', None)
+    sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+    import ingest
+    import sources
+    sources.use(source)
+
+    timings = {}
+    started = time.perf_counter()
+    ingest.run(years, snapshot_dir)
+    timings['ingest_s'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    import app  # noqa: F401 (registers the pages)
+    import datastore
+    for lazy in datastore.lazies.values():
+        lazy.get()
+    timings['load_s'] = time.perf_counter() - started
+    return timings
+
+
+def triggered(prop_id):
+    # the callbacks branch on ctx.triggered_id, which dash fills in from the request; set it to the input the case
+    # changes (none for a page load)
+    from dash._callback_context import context_value
+    from dash._utils import AttributeDict
+    context_value.set(AttributeDict(triggered_inputs=[{'prop_id': prop_id, 'value': None}] if prop_id else []))
+
+
+def page_cases(name, config):
+    import cache
+    import datastore
+    import figures
+
+    module = sys.modules['pages.' + name]
+    p, ids = config['prefix'], config['ids']
+    x, y, z = config['axes']
+    player = config['player']
+    data = datastore.lazies[name].get()
+    frames = data['frames']
+    season = int(frames['dfr']['season'].max())
+    extra = config['extra']
+
+    # the player a hover moves to: the best season total at the page's position that isn't the default player
+    position = extra[0] if extra else name.upper()
+    scatter = data['season_store'][(position, season)]
+    names = scatter['display_name' if name == 'home' else 'player_display_name'].astype(str)
+    other = scatter.loc[names != player].nlargest(1, 'fantasy_points_ppr')
+    other = str(other['display_name' if name == 'home' else 'player_display_name'].iloc[0])
+
+    update_graph = getattr(module, p + 'update_graph')
+    update_player = getattr(module, p + 'update_player')
+    update_time_series = getattr(module, p + 'update_time_series')
+    player_series = getattr(module, p + 'player_series')
+    player_stats_table = getattr(module, p + 'player_stats_table')
+    create_time_series = getattr(module, p + 'create_time_series')
+    rows = data['dfr_players' if name == 'home' else 'weekly_players'].rows(player)
+    rows = rows[rows['Category'] == x]
+    base = figures.time_series_layout(create_time_series, 'season' if name == 'home' else 'week',
+                                      None if name == 'home' else 'season')
+
+    hover = {'points': [{'customdata': other}]}
+    slider, xaxis, select = ids + 'crossfilter-year-slider.value', ids + 'crossfilter-xaxis-column.value', \
+        ids + 'select-player-list.value'
+    # (case, trigger, call, whether the caches are cleared before every call)
+    cases = [
+        ('update_graph', slider, lambda: update_graph(x, y, z, season, *extra, None), True),
+        ('update_graph.cached', slider, lambda: update_graph(x, y, z, season, *extra, None), False),
+        ('update_graph.axis', xaxis,
+         lambda: update_graph(config['other_axis'], y, z, season, *extra, datastore.version), True),
+        ('update_player.select', select, lambda: update_player(hover, player), True),
+        ('update_player.hover', ids + 'crossfilter-indicator-scatter.hoverData',
+         lambda: update_player(hover, player), True),
+        ('update_time_series', ids + 'player-series.data',
+         lambda: update_time_series(player_series(player), x, y, z, base), True),
+        ('update_time_series.axis', xaxis,
+         lambda: update_time_series(player_series(player), config['other_axis'], y, z, base), True),
+        ('create_time_series', None, lambda: create_time_series(rows, x), False),
+        ('player_stats_table', None, lambda: player_stats_table(player), False),
+    ]
+    update_leaderboard = getattr(module, p + 'update_leaderboard', None)
+    if update_leaderboard is not None:
+        by_x = [{'column_id': x, 'direction': 'desc'}]
+        query = '{{{}}} > 0 && {{player_display_name}} icontains "a"'.format(x)
+        cases += [
+            ('update_leaderboard', None, lambda: update_leaderboard(season, 0, 20, by_x, ''), False),
+            ('update_leaderboard.filter', ids + 'leaderboard.filter_query',
+             lambda: update_leaderboard(season, 0, 20, by_x, query), False),
+        ]
+    simulate_seasons = getattr(module, p + 'simulate_seasons', None)
+    if simulate_seasons is not None:
+        cases.append(('simulate_seasons', ids + 'simulation-run.n_clicks',
+                      lambda: simulate_seasons(1, [season - 2, season], 10000), False))
+    return cases, cache.clear_all
+
+
+def measure(call, trigger, cold, clear, repeat, warmup):
+    def prepare():
+        if cold:
+            clear()
+        triggered(trigger)
+
+    for _ in range(warmup):
+        prepare()
+        call()
+
+    times = []
+    for _ in range(repeat):
+        prepare()
+        started = time.perf_counter_ns()
+        call()
+        times.append(time.perf_counter_ns() - started)
+
+    # allocations come from a separate call, since tracing them slows everything down
+    prepare()
+    tracemalloc.start()
+    call()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ms = np.array(times) / 1e6
+    return {
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p90_ms': float(np.percentile(ms, 90)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'mean_ms': float(ms.mean()),
+        'min_ms': float(ms.min()),
+        'peak_kb': peak / 1024,
+        'retained_kb': retained / 1024,
+    }
+
+
+def commit():
+    try:
+        sha = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                             check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return sha + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def environment(years):
+    import dash
+    import pandas as pd
+    import plotly
+
+    import sources
+    return {'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+            'dash': dash.__version__, 'plotly': plotly.__version__, 'machine': platform.machine(),
+            'source': repr(sources.active()), 'seasons': years}
+
+
+def report(results, baseline=None):
+    header = '{:<36} {:>9} {:>9} {:>9} {:>10} {:>10}'.format('callback', 'p50 ms', 'p90 ms', 'p99 ms', 'peak KB',
+                                                           'retained KB')
+    if baseline:
+        header += ' {:>10}'.format('p50 vs base')
+    print(header)
+    for case, stats in results['cases'].items():
+        line = '{:<36} {:>9.2f} {:>9.2f} {:>9.2f} {:>10.0f} {:>10.0f}'.format(
+            case, stats['p50_ms'], stats['p90_ms'], stats['p99_ms'], stats['peak_kb'], stats['retained_kb'])
+        if baseline and case in baseline['cases']:
+            line += ' {:>10}'.format('{:.2f}x'.format(stats['p50_ms'] / baseline['cases'][case]['p50_ms']))
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every page callback against the offline fixture data.')
+    parser.add_argument('--repeat', type=int, default=50, help='timed calls per callback')
+    parser.add_argument('--warmup', type=int, default=3, help='untimed calls per callback before timing')
+    parser.add_argument('--pages', nargs='+', default=list(PAGES), choices=list(PAGES), help='pages to benchmark')
+    parser.add_argument('--filter', default='', help='only run cases whose name contains this')
+    parser.add_argument('--source', default='fixture',
+                        help='data source to build the snapshot from, e.g. fixture:players=4 for four times the players')
+    parser.add_argument('--years', type=int, nargs='+', default=[2019, 2020, 2021, 2022, 2023], help='seasons to load')
+    parser.add_argument('--out', help='results file (default benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', help='results file from another run to compare against')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        timings = setup(snapshot_dir, args.source, args.years)
+        results = {'commit': commit(), 'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                   'environment': environment(args.years), 'setup': timings, 'repeat': args.repeat, 'cases': {}}
+
+        for name in args.pages:
+            cases, clear = page_cases(name, PAGES[name])
+            for case, trigger, call, cold in cases:
+                key = '{}.{}'.format(name, case)
+                if args.filter in key:
+                    results['cases'][key] = measure(call, trigger, cold, clear, args.repeat, args.warmup)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for key in ('source', 'seasons'):
+            if baseline.get('environment', {}).get(key) != results['environment'][key]:
+                print('warning: {} was run with a different {}'.format(args.compare, key))
+
+    print('commit {}, ingest {:.1f}s, load {:.1f}s'.format(results['commit'], timings['ingest_s'], timings['load_s']))
+    report(results, baseline)
+
+    out = args.out or os.path.join(RESULTS, '{}.json'.format(results['commit']))
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('wrote {}'.format(out))
+
+
+if __name__ == '__main__':
+    main()
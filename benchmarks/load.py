@@ -0,0 +1,395 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from callbacks import RESULTS, ROOT, commit
+
+# starts the app under gunicorn on a snapshot built from the fixture data source and replays what people do on the
+# pages (open a page, move the season slider, change an axis, sweep the mouse across the scatter) as the same POSTs
+# to /_dash-update-component the browser sends, from a number of simulated users at once. reports throughput, tail
+# latency and errors per callback for each gunicorn workers x threads configuration
+#
+#     python benchmarks/load.py --configs 1x1 2x1 1x4 2x4 --users 8 --duration 30
+#     python benchmarks/load.py --url http://localhost:8050 --users 4     # an already running server
+
+SRC = os.path.join(ROOT, 'src')
+
+# what a visit does after the page has loaded, weighted: move the slider, change an axis, sweep the scatter or type a
+# player's name into the search
+ACTIONS = {'slider': 3, 'axis': 2, 'hover': 5, 'search': 1}
+
+# seconds between keystrokes in the player search
+KEYSTROKE = 0.15
+
+
+class Recorder:
+    # every request made during the measured part of a run: (callback, seconds taken, status, response bytes).
+    # status is None when the request failed without a response
+    def __init__(self):
+        self.samples = []
+        self.recording = False
+        self._lock = threading.Lock()
+
+    def add(self, label, seconds, status, size):
+        if self.recording:
+            with self._lock:
+                self.samples.append((label, seconds, status, size))
+
+
+class User:
+    # one browser tab: keeps the props of the components on the current page and, like the dash renderer, sends the
+    # server callbacks an input change fires, then the ones their outputs fire in turn. waits for each response
+    # before the next request, so the number of users is the number of requests in flight
+    def __init__(self, url, dependencies, recorder, rng, think, hover_gap, hovers):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.connection = None
+        self.callbacks = [c for c in dependencies if not c['clientside_function']]
+        self.recorder = recorder
+        self.rng = rng
+        self.think = think
+        self.hover_gap = hover_gap
+        self.hovers = hovers
+        self.state = {}
+        self.ids = ''
+
+    def post(self, label, body):
+        payload = json.dumps(body).encode()
+        started = time.perf_counter()
+        try:
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            self.connection.request('POST', '/_dash-update-component', payload, {'Content-Type': 'application/json'})
+            response = self.connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.recorder.add(label, time.perf_counter() - started, None, 0)
+            if self.connection is not None:
+                self.connection.close()
+            self.connection = None
+            return None
+        self.recorder.add(label, time.perf_counter() - started, response.status, len(data))
+        if response.status != 200:
+            return None
+        return json.loads(data)['response']
+
+    def fire(self, callback, changed):
+        outputs = outputs_of(callback)
+        body = {
+            'output': callback['output'],
+            'outputs': outputs if callback['output'].startswith('..') else outputs[0],
+            'inputs': [dict(i, value=self.state.get((i['id'], i['property']))) for i in callback['inputs']],
+            'state': [dict(s, value=self.state.get((s['id'], s['property']))) for s in callback['state']],
+            'changedPropIds': sorted(changed),
+        }
+        response = self.post(label_of(callback), body)
+        updated = set()
+        for component, props in (response or {}).items():
+            for prop, value in props.items():
+                # a Patch only makes sense applied to the figure the browser already has; the hover targets come
+                # from the last full figure, which has the same players
+                if isinstance(value, dict) and '__dash_patch_update' in value:
+                    continue
+                self.state[(component, prop)] = value
+                updated.add('{}.{}'.format(component, prop))
+        return updated
+
+    def change(self, changed, fired=()):
+        # fire every server callback with one of the changed props as an input, then whatever their outputs fire
+        for callback in self.callbacks:
+            inputs = {'{}.{}'.format(i['id'], i['property']) for i in callback['inputs']}
+            if callback['output'] in fired or not inputs & changed or not self.on_page(callback):
+                continue
+            updated = self.fire(callback, inputs & changed)
+            if updated:
+                self.change(updated, fired + (callback['output'],))
+
+    def on_page(self, callback):
+        return all((i['id'], i['property']) in self.state or i['id'] in self.components
+                   for i in callback['inputs'])
+
+    def open(self, path):
+        # the page layout comes from dash pages' own callback; after it, the renderer fires every callback of the
+        # page that isn't prevent_initial_call, upstream ones first
+        self.state = {('_pages_location', 'pathname'): path, ('_pages_location', 'search'): ''}
+        self.components = set()
+        pages = next(c for c in self.callbacks if c['output'].startswith('.._pages_content.'))
+        self.fire(pages, {'_pages_location.pathname'})
+        walk(self.state.pop(('_pages_content', 'children'), None), self.state, self.components)
+        self.ids = next((c[:-len('crossfilter-indicator-scatter')] for c in self.components
+                         if c.endswith('crossfilter-indicator-scatter')), '')
+
+        initial = [c for c in self.callbacks if not c['prevent_initial_call'] and self.on_page(c)]
+        produced = {o['id'] for c in initial for o in outputs_of(c)}
+        for callback in initial:
+            if not any(i['id'] in produced for i in callback['inputs']):
+                self.change(self.fire(callback, set()), (callback['output'],))
+
+    def slider(self):
+        key = (self.ids + 'crossfilter-year-slider', 'value')
+        seasons = [int(s) for s in self.state.get((key[0], 'marks'), {})] or [self.state.get(key)]
+        self.state[key] = self.rng.choice(seasons)
+        self.change({'{}.{}'.format(*key)})
+
+    def axis(self):
+        key = (self.ids + 'crossfilter-{}axis-column'.format(self.rng.choice('xyz')), 'value')
+        options = [o for o in self.state.get((key[0], 'options'), []) if o != self.state.get(key)]
+        if options:
+            self.state[key] = self.rng.choice(options)
+            self.change({'{}.{}'.format(*key)})
+
+    def hover(self):
+        # a sweep across the scatter hovers one player after another, as fast as the pointer moves
+        figure = self.state.get((self.ids + 'crossfilter-indicator-scatter', 'figure')) or {}
+        players = (figure.get('data') or [{}])[0].get('customdata') or []
+        for _ in range(self.hovers if players else 0):
+            point = self.rng.randrange(len(players))
+            self.state[(self.ids + 'crossfilter-indicator-scatter', 'hoverData')] = {
+                'points': [{'curveNumber': 0, 'pointNumber': point, 'customdata': players[point]}]}
+            self.change({self.ids + 'crossfilter-indicator-scatter.hoverData'})
+            time.sleep(self.hover_gap)
+
+    def search(self):
+        # type the first few letters of one of the players on the scatter, one request per keystroke
+        figure = self.state.get((self.ids + 'crossfilter-indicator-scatter', 'figure')) or {}
+        players = (figure.get('data') or [{}])[0].get('customdata') or []
+        if players:
+            name = self.rng.choice(players)
+            for n in range(1, min(len(name), 5) + 1):
+                self.state[(self.ids + 'select-player-list', 'search_value')] = name[:n]
+                self.change({self.ids + 'select-player-list.search_value'})
+                time.sleep(KEYSTROKE)
+
+    def visit(self, paths, actions):
+        self.open(self.rng.choice(paths))
+        for _ in range(actions):
+            time.sleep(self.think)
+            getattr(self, self.rng.choices(list(ACTIONS), list(ACTIONS.values()))[0])()
+
+
+def outputs_of(callback):
+    # an output shared with another callback (allow_duplicate) has a hash after its property, which isn't sent
+    output = callback['output']
+    parts = output[2:-2].split('...') if output.startswith('..') else [output]
+    return [dict(zip(('id', 'property'), part.split('@')[0].rsplit('.', 1))) for part in parts]
+
+
+def label_of(callback):
+    # a callback is named after its first output, which is unique to it
+    return '{id}.{property}'.format(**outputs_of(callback)[0])
+
+
+def walk(node, state, components):
+    # every prop of every component with an id in a layout, as the renderer would hold them
+    if isinstance(node, list):
+        for child in node:
+            walk(child, state, components)
+    elif isinstance(node, dict) and 'props' in node:
+        props = node['props']
+        if 'id' in props:
+            components.add(props['id'])
+            state.update({(props['id'], prop): value for prop, value in props.items() if prop != 'children'})
+        walk(props.get('children'), state, components)
+
+
+def get(url, path):
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+    try:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def wait_ready(url, server, timeout, confirmations):
+    # /healthz answers from whichever worker accepts the connection, so every worker is only known to have its
+    # page data loaded once enough answers in a row say so
+    deadline = time.monotonic() + timeout
+    streak = 0
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError('gunicorn exited with {}'.format(server.returncode))
+        try:
+            status, body = get(url, '/healthz')
+            ready = status == 200 and all(json.loads(body)['ready'].values())
+        except (OSError, http.client.HTTPException, ValueError):
+            ready = False
+        streak = streak + 1 if ready else 0
+        if streak >= confirmations:
+            return
+        time.sleep(0.2)
+    raise RuntimeError('{} was not ready after {}s'.format(url, timeout))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers, threads, snapshot_dir, log):
+    port = free_port()
+    env = dict(os.environ, FF_SNAPSHOT_DIR=snapshot_dir, FF_WARM_UP='1', FF_REFRESH_INTERVAL='0')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--chdir', SRC, '--bind', '127.0.0.1:{}'.format(port),
+                               '--workers', str(workers), '--threads', str(threads), '--timeout', '120', 'app:server'],
+                              env=env, stdout=log, stderr=subprocess.STDOUT)
+    return server, 'http://127.0.0.1:{}'.format(port)
+
+
+def server_rss(server):
+    # resident memory of the gunicorn master and its workers, in MB; linux only
+    try:
+        pids = [server.pid] + [int(p) for p in open('/proc/{0}/task/{0}/children'.format(server.pid)).read().split()]
+        pages = sum(int(open('/proc/{}/statm'.format(pid)).read().split()[1]) for pid in pids)
+    except OSError:
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def run_load(url, args):
+    status, body = get(url, '/_dash-dependencies')
+    dependencies = json.loads(body)
+    recorder = Recorder()
+    stop = threading.Event()
+
+    def simulate(n):
+        user = User(url, dependencies, recorder, random.Random(args.seed + n), args.think, args.hover_gap,
+                    args.hovers)
+        while not stop.is_set():
+            user.visit(args.paths, args.actions)
+
+    users = [threading.Thread(target=simulate, args=(n,), daemon=True) for n in range(args.users)]
+    for user in users:
+        user.start()
+    time.sleep(args.warmup)
+    recorder.recording = True
+    started = time.monotonic()
+    time.sleep(args.duration)
+    recorder.recording = False
+    elapsed = time.monotonic() - started
+    stop.set()
+    for user in users:
+        user.join(timeout=60)
+    return summarize(recorder.samples, elapsed)
+
+
+def summarize(samples, elapsed):
+    def stats(rows):
+        ms = np.array([row[1] for row in rows]) * 1000
+        errors = sum(1 for row in rows if row[2] is None or row[2] >= 400)
+        return {
+            'requests': len(rows),
+            'rps': len(rows) / elapsed,
+            'p50_ms': float(np.percentile(ms, 50)),
+            'p95_ms': float(np.percentile(ms, 95)),
+            'p99_ms': float(np.percentile(ms, 99)),
+            'max_ms': float(ms.max()),
+            'error_rate': errors / len(rows),
+            'mean_kb': float(np.mean([row[3] for row in rows])) / 1024,
+        }
+
+    callbacks = {}
+    for row in samples:
+        callbacks.setdefault(row[0], []).append(row)
+    return {'duration_s': elapsed, 'total': stats(samples) if samples else None,
+            'callbacks': {label: stats(rows) for label, rows in sorted(callbacks.items())}}
+
+
+def report(name, result):
+    print('\n{} ({:.0f}s measured)'.format(name, result['duration_s']))
+    print('{:<48} {:>8} {:>8} {:>9} {:>9} {:>9} {:>7} {:>9}'.format(
+        'callback', 'requests', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'errors', 'mean KB'))
+    rows = list(result['callbacks'].items()) + ([('total', result['total'])] if result['total'] else [])
+    for label, s in rows:
+        print('{:<48} {:>8} {:>8.1f} {:>9.1f} {:>9.1f} {:>9.1f} {:>6.1%} {:>9.1f}'.format(
+            label, s['requests'], s['rps'], s['p50_ms'], s['p95_ms'], s['p99_ms'], s['error_rate'], s['mean_kb']))
+
+
+def compare(results):
+    print('\n{:<10} {:>8} {:>9} {:>9} {:>7} {:>8}'.format('config', 'req/s', 'p95 ms', 'p99 ms', 'errors', 'RSS MB'))
+    for name, result in results.items():
+        s = result['total']
+        if s is None:
+            print('{:<10} no requests completed'.format(name))
+            continue
+        rss = '{:.0f}'.format(result['rss_mb']) if result.get('rss_mb') else '-'
+        print('{:<10} {:>8.1f} {:>9.1f} {:>9.1f} {:>6.1%} {:>8}'.format(
+            name, s['rps'], s['p95_ms'], s['p99_ms'], s['error_rate'], rss))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the dash callback endpoint with simulated users.')
+    parser.add_argument('--configs', nargs='+', default=['1x1', '2x1', '1x4', '2x4'],
+                        help='gunicorn configurations to compare, as <workers>x<threads>')
+    parser.add_argument('--url', help='test this running server instead of starting gunicorn')
+    parser.add_argument('--users', type=int, default=8, help='simulated users, each with one request in flight')
+    parser.add_argument('--duration', type=float, default=30, help='seconds measured per configuration')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds of load before measuring')
+    parser.add_argument('--paths', nargs='+', default=['/', '/qb', '/rb', '/wr', '/te'], help='pages the users visit')
+    parser.add_argument('--actions', type=int, default=10, help='actions per page visit')
+    parser.add_argument('--hovers', type=int, default=20, help='players hovered per sweep across the scatter')
+    parser.add_argument('--think', type=float, default=0.5, help='seconds between actions')
+    parser.add_argument('--hover-gap', type=float, default=0.03, help='seconds between hovers in a sweep')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the users\' choices')
+    parser.add_argument('--source', default='fixture', help='data source to build the snapshot from')
+    parser.add_argument('--years', type=int, nargs='+', default=[2019, 2020, 2021, 2022, 2023], help='seasons to load')
+    parser.add_argument('--out', help='results file (default benchmarks/results/load-<commit>.json)')
+    args = parser.parse_args()
+
+    results = {'commit': commit(), 'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+               'settings': {k: v for k, v in vars(args).items() if k not in ('out', 'configs')}, 'configs': {}}
+
+    if args.url:
+        wait_ready(args.url, None, 300, 1)
+        results['configs'][args.url] = run_load(args.url, args)
+        report(args.url, results['configs'][args.url])
+    else:
+        sys.path.insert(0, SRC)
+        import ingest
+        import sources
+        sources.use(args.source)
+
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            ingest.run(args.years, snapshot_dir)
+            for config in args.configs:
+                workers, threads = (int(n) for n in config.split('x'))
+                with open(os.path.join(snapshot_dir, 'gunicorn-{}.log'.format(config)), 'w+') as log:
+                    server, url = start_server(workers, threads, snapshot_dir, log)
+                    try:
+                        wait_ready(url, server, 300, workers * 4)
+                        result = run_load(url, args)
+                        result['rss_mb'] = server_rss(server)
+                    except RuntimeError as e:
+                        log.seek(0)
+                        print('{}: {}\n{}'.format(config, e, log.read()[-2000:]))
+                        continue
+                    finally:
+                        server.terminate()
+                        server.wait(timeout=60)
+                results['configs'][config] = result
+                report('{} workers x {} threads'.format(workers, threads), result)
+
+    compare(results['configs'])
+    out = args.out or os.path.join(RESULTS, 'load-{}.json'.format(results['commit']))
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('wrote {}'.format(out))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from callbacks import ROOT
+
+# times the weekly frame preparation ingest runs for every position on each build and refresh: the integer week key
+# and the integer sort in ingest.position_weeks against the zero padded season_sort_order string it replaced, and
+# the home ratios in one pass against one column at a time. checks both give the same rows in the same order
+#
+#     python benchmarks/ordering.py --source fixture:players=10 --years 2010 2011 2012 2013 2014 2015 2016
+
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+
+def string_position_weeks(weekly, position):
+    # position_weeks as it was, building and sorting on a 'season.week' string
+    import ingest
+    stats = ingest.POSITIONS[position]['stats']
+
+    player_stats = weekly.loc[weekly['position'] == position, ingest.WEEKLY_COLUMNS + stats]
+
+    player_stats['new_week'] = player_stats['week'].astype(str)
+    player_stats['new_week'] = np.where(player_stats['new_week'].str.len() == 1, '0' + player_stats['new_week'],
+                                        player_stats['new_week'])
+    player_stats['games'] = 1
+    player_stats['season_sort_order'] = player_stats['season'].astype(str) + '.' + player_stats['new_week'].astype(str)
+
+    return player_stats.sort_values(['player_display_name', 'season_sort_order'])
+
+
+def column_ratios(df, ratios):
+    df = df.copy()
+    for name, (numerator, denominator) in ratios.items():
+        df[name] = df[numerator] / df[denominator]
+    return df
+
+
+def best(func, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - started)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the integer and string week ordering in ingest.')
+    parser.add_argument('--source', default='fixture', help='data source to take the weekly data from')
+    parser.add_argument('--years', type=int, nargs='+', default=[2019, 2020, 2021, 2022, 2023], help='seasons')
+    parser.add_argument('--repeat', type=int, default=5, help='runs of each, the fastest is reported')
+    args = parser.parse_args()
+
+    import ingest
+    import pandas as pd
+    import sources
+    sources.use(args.source)
+
+    weekly = ingest.fetch_weekly(args.years)
+    seasonal = sources.active().import_seasonal_data(args.years)
+    print('{} weekly rows, {} season rows'.format(len(weekly), len(seasonal)))
+    print('{:<24} {:>12} {:>12} {:>8}'.format('step', 'before ms', 'after ms', 'speedup'))
+
+    for position in sorted(ingest.POSITIONS):
+        before, old = best(lambda: string_position_weeks(weekly, position), args.repeat)
+        after, new = best(lambda: ingest.position_weeks(weekly, position), args.repeat)
+        assert old.index.equals(new.index), 'rows of {} are in a different order'.format(position)
+        print('{:<24} {:>12.1f} {:>12.1f} {:>7.1f}x'.format('position_weeks ' + position, before * 1000,
+                                                            after * 1000, before / after))
+
+    before, old = best(lambda: column_ratios(seasonal, ingest.HOME_RATIOS), args.repeat)
+    after, new = best(lambda: ingest.add_ratios(seasonal, ingest.HOME_RATIOS), args.repeat)
+    pd.testing.assert_frame_equal(old, new)
+    print('{:<24} {:>12.1f} {:>12.1f} {:>7.1f}x'.format('home ratios', before * 1000, after * 1000, before / after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+import argparse
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from callbacks import PAGES, RESULTS, commit, environment, page_cases, setup, triggered
+
+# the size of what every page callback sends to the browser, with the compact figures (figures.COMPACT) off and on,
+# as plain JSON and gzipped, and how long encoding it takes with the json and orjson engines plotly (and so dash)
+# can use. each mode runs in its own process, as the table rows are rounded when the page data loads
+#
+#     python benchmarks/payload.py
+#     python benchmarks/payload.py --pages wr --out /tmp/payload.json
+
+ENGINES = ('json', 'orjson')
+
+# cases of callbacks.page_cases that time helpers the callbacks call rather than a response of their own
+HELPERS = ('create_time_series', 'player_stats_table')
+
+
+def response(value):
+    # what dash encodes for a callback's return value: multiple outputs without the ones left as no_update
+    from dash import no_update
+    if isinstance(value, tuple):
+        return [v for v in value if v is not no_update]
+    return value
+
+
+def encode_ms(value, engine, repeat):
+    from plotly.io.json import to_json_plotly
+    started = time.perf_counter()
+    for _ in range(repeat):
+        to_json_plotly(value, engine=engine)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def measure(pages, repeat, years, out):
+    # runs in the child process: every case of every page, plus the page layout, which carries the time series layout
+    from plotly.io.json import to_json_plotly
+    setup(tempfile.mkdtemp(prefix='ff-payload-'), 'fixture', years)
+
+    cases = {}
+    for name in pages:
+        calls, clear = page_cases(name, PAGES[name])
+        module = sys.modules['pages.' + name]
+        calls = [('layout', None, module.layout, False)] + calls
+        for case, trigger, call, _ in calls:
+            if case in HELPERS:
+                continue
+            clear()
+            triggered(trigger)
+            value = response(call())
+            data = to_json_plotly(value).encode()
+            cases['{}.{}'.format(name, case)] = dict(
+                {'bytes': len(data), 'gzip_bytes': len(gzip.compress(data))},
+                **{engine + '_ms': encode_ms(value, engine, repeat) for engine in ENGINES})
+    with open(out, 'w') as f:
+        json.dump({'environment': environment(years), 'cases': cases}, f)
+
+
+def run(compact, args):
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+        out = f.name
+    command = [sys.executable, os.path.abspath(__file__), '--measure', out, '--repeat', str(args.repeat),
+               '--pages', *args.pages, '--years', *map(str, args.years)]
+    subprocess.run(command, env=dict(os.environ, FF_COMPACT_FIGURES='1' if compact else '0'), check=True)
+    with open(out) as f:
+        results = json.load(f)
+    os.remove(out)
+    return results
+
+
+def report(before, after):
+    print('{:<32} {:>10} {:>10} {:>7} {:>10} {:>10} {:>9} {:>9}'.format(
+        'callback', 'before B', 'after B', 'saved', 'gzip bef', 'gzip aft', 'json ms', 'orjson ms'))
+    totals = [0, 0, 0, 0]
+    for case, new in after.items():
+        old = before[case]
+        saved = 1 - new['bytes'] / old['bytes'] if old['bytes'] else 0
+        print('{:<32} {:>10} {:>10} {:>6.0%} {:>10} {:>10} {:>9.3f} {:>9.3f}'.format(
+            case, old['bytes'], new['bytes'], saved, old['gzip_bytes'], new['gzip_bytes'], new['json_ms'],
+            new['orjson_ms']))
+        for i, value in enumerate((old['bytes'], new['bytes'], old['gzip_bytes'], new['gzip_bytes'])):
+            totals[i] += value
+    print('{:<32} {:>10} {:>10} {:>6.0%} {:>10} {:>10}'.format(
+        'total', totals[0], totals[1], 1 - totals[1] / totals[0], totals[2], totals[3]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare callback response sizes with compact figures off and on.')
+    parser.add_argument('--pages', nargs='+', default=list(PAGES), choices=list(PAGES), help='pages to measure')
+    parser.add_argument('--years', type=int, nargs='+', default=[2019, 2020, 2021, 2022, 2023], help='seasons to load')
+    parser.add_argument('--repeat', type=int, default=50, help='encodes of each response to time')
+    parser.add_argument('--out', help='results file (default benchmarks/results/payload-<commit>.json)')
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.pages, args.repeat, args.years, args.measure)
+        return
+
+    before, after = run(False, args), run(True, args)
+    report(before['cases'], after['cases'])
+
+    out = args.out or os.path.join(RESULTS, 'payload-{}.json'.format(commit()))
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump({'commit': commit(), 'environment': after['environment'],
+                   'cases': {case: {'before': before['cases'][case], 'after': new}
+                             for case, new in after['cases'].items()}}, f, indent=1)
+    print('wrote', out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+import pandas as pd
+from dash import dash_table, dcc, html
+from dash.dash_table.Format import Format, Scheme, Trim
+
+import figures
+
+# the season simulation on the WR page, an example of a background job (jobs.py). FF_SIMULATION=1 turns it on
+SIMULATION = os.environ.get('FF_SIMULATION', '0') == '1'
+
+# simulated seasons per player the page offers, and the one it starts on
+RUNS = [10000, 100000, 1000000]
+SIMULATIONS = 100000
+
+# weekly scores in a simulated season
+GAMES = 17
+
+# players simulated, the best by points per game
+PLAYERS = 24
+
+# weeks a player needs in the chosen seasons to be simulated
+MIN_GAMES = 8
+
+# simulated seasons drawn at a time, so memory stays the same however many are asked for
+CHUNK = 20000
+
+COLUMNS = ['player', 'games', 'per_game', 'p10', 'median', 'p90']
+
+
+def weekly_points(weekly, column, seasons, stat='fantasy_points_ppr'):
+    # {player: their weekly values of a stat} over a range of seasons, from a page's melted weekly frame
+    rows = weekly[(weekly['Category'] == stat) & weekly['season'].between(*seasons)]
+    values = rows['value'].to_numpy(dtype=np.float64)
+    return {player: values[positions] for player, positions in rows.groupby(column, observed=True).indices.items()}
+
+
+def simulate(weekly, column, seasons, simulations=SIMULATIONS, progress=None, seed=0):
+    # a bootstrap of each player's season: every simulated season is GAMES weekly scores drawn, with replacement,
+    # from the player's own weeks in the chosen seasons. returns table rows with the spread of the simulated season
+    # totals, best median first. progress(done, total) is called after each player. the seed is fixed so the same
+    # inputs give the same table, which is what lets the job cache answer repeats
+    points = {player: values for player, values in weekly_points(weekly, column, seasons).items()
+              if len(values) >= MIN_GAMES}
+    players = sorted(points, key=lambda player: points[player].mean(), reverse=True)[:PLAYERS]
+    rng = np.random.default_rng(seed)
+
+    rows = []
+    for i, player in enumerate(players):
+        values = points[player]
+        totals = np.concatenate([
+            values[rng.integers(0, len(values), size=(min(CHUNK, simulations - start), GAMES))].sum(axis=1)
+            for start in range(0, simulations, CHUNK)])
+        p10, median, p90 = np.percentile(totals, [10, 50, 90])
+        rows.append({'player': player, 'games': len(values), 'per_game': values.mean(), 'p10': p10,
+                     'median': median, 'p90': p90})
+        if progress is not None:
+            progress(i + 1, len(players))
+
+    df = pd.DataFrame(rows, columns=COLUMNS).sort_values('median', ascending=False, kind='stable')
+    return figures.rounded(df).to_dict('records')
+
+
+def controls(prefix, seasons):
+    # the inputs of a page's simulation: the seasons whose weeks are drawn from, how many seasons to simulate, run and
+    # cancel buttons and a progress bar. ids start with the page's prefix
+    seasons = sorted(int(season) for season in seasons)
+    return html.Div([
+        html.Div([html.P("Seasons drawn from"),
+                  dcc.RangeSlider(seasons[0], seasons[-1], step=1,
+                                  value=[max(seasons[0], seasons[-1] - 2), seasons[-1]],
+                                  marks={str(season): str(season) for season in seasons},
+                                  id=prefix + '-simulation-seasons')],
+                 style={'width': '49%', 'display': 'inline-block'}),
+        html.Div([html.P("Simulated seasons"),
+                  dcc.Dropdown(RUNS, SIMULATIONS, clearable=False, id=prefix + '-simulation-runs')],
+                 style={'width': '20%', 'display': 'inline-block', 'padding': '0px 20px'}),
+        html.Div([html.Button('Simulate', id=prefix + '-simulation-run'),
+                  html.Button('Cancel', id=prefix + '-simulation-cancel', disabled=True),
+                  html.Progress(id=prefix + '-simulation-progress', value='0', max='1')],
+                 style={'display': 'inline-block'}),
+    ])
+
+
+def table(id):
+    columns = [{'id': c, 'name': c, 'type': 'text' if c == 'player' else 'numeric'} for c in COLUMNS]
+    for column in columns[2:]:
+        column['format'] = Format(precision=2, scheme=Scheme.fixed, trim=Trim.yes)
+    return dash_table.DataTable(id=id, columns=columns, data=[], sort_action='native', page_size=PLAYERS)
@@ -1,12 +1,36 @@
-import dash
-from dash import Dash, dcc, html, Output, Input, State
-import dash_bootstrap_components as dbc
+import profiling
 
-app = dash.Dash(__name__, use_pages=True, external_stylesheets=[dbc.themes.SPACELAB])
+# imported first so the startup profile (FF_PROFILE_STARTUP=1) includes the other imports
+with profiling.stage('imports'):
+    import dash
+    from dash import Dash, dcc, html, Output, Input, State
+    import dash_bootstrap_components as dbc
+
+    import datastore
+    import jobs
+    import metrics
+    import refresh
+
+# the pages build their layouts once their data has loaded, so their components aren't all in the initial layout.
+# their heavy callbacks run as background jobs (see jobs.py)
+with profiling.stage('register pages'):
+    app = dash.Dash(__name__, use_pages=True, suppress_callback_exceptions=True,
+                    external_stylesheets=[dbc.themes.SPACELAB],
+                    background_callback_manager=jobs.manager())
 
 # server
 server = app.server
 
+# callback latency, response sizes, cache hit rates and data load times in the prometheus format, at /metrics
+metrics.init(app)
+
+
+# answers as soon as the worker has imported the app; the page data may still be loading in the background
+@server.route('/healthz')
+def healthz():
+    return {'status': 'ok', 'ready': datastore.ready()}
+
+
 sidebar = dbc.Nav(
             [
                 dbc.NavLink(
@@ -48,5 +72,14 @@ app.layout= dbc.Container([
 fluid=True
 )
 
+if datastore.WARM_UP:
+    # reports the startup profile once every page has loaded
+    datastore.warm_up()
+else:
+    profiling.finish()
+
+if refresh.REFRESH_INTERVAL:
+    refresh.start()
+
 if __name__ == "__main__":
     app.run_server(debug=True)
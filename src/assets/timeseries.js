@@ -0,0 +1,65 @@
+// draws the x, y and z time series from the compact payload the server puts in the *-player-series store
+// (figures.series_payload) and the shared layout in the *-time-series-layout store (figures.time_series_layout)
+
+function timeSeriesFigure(series, base, column, title) {
+    var x = series.x;
+    var y = series.values[column] || [];
+    var colorway = ((base.layout.template || {}).layout || {}).colorway || ['#636efa'];
+    var traces = [];
+
+    if (series.group) {
+        // one line per season, in the order the seasons appear
+        var groups = [];
+        var points = {};
+        series.group.forEach(function(g, i) {
+            if (!(g in points)) {
+                groups.push(g);
+                points[g] = {x: [], y: []};
+            }
+            points[g].x.push(x[i]);
+            points[g].y.push(y[i]);
+        });
+        groups.forEach(function(g, i) {
+            traces.push({
+                type: 'scatter', mode: 'lines+markers', orientation: 'v', xaxis: 'x', yaxis: 'y',
+                x: points[g].x, y: points[g].y,
+                name: String(g), legendgroup: String(g), showlegend: true,
+                line: {color: colorway[i % colorway.length], dash: 'solid'},
+                marker: {symbol: 'circle'},
+                hovertemplate: base.group + '=' + g + '<br>' + base.x + '=%{x}<br>value=%{y}<extra></extra>'
+            });
+        });
+    } else {
+        traces.push({
+            type: 'scatter', mode: 'lines+markers', orientation: 'v', xaxis: 'x', yaxis: 'y',
+            x: x, y: y,
+            name: '', legendgroup: '', showlegend: false,
+            marker: {color: colorway[0], symbol: 'circle'},
+            hovertemplate: base.x + '=%{x}<br>value=%{y}<extra></extra>'
+        });
+    }
+
+    var layout = Object.assign({}, base.layout, {
+        annotations: [{
+            x: 0, y: 0.85, xanchor: 'left', yanchor: 'bottom', xref: 'paper', yref: 'paper',
+            showarrow: false, align: 'left', text: title
+        }]
+    });
+    return {data: traces, layout: layout};
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    timeseries: {
+        draw: function(series, xaxis, yaxis, zaxis, base) {
+            if (!series || !series.values || !base) {
+                return [window.dash_clientside.no_update, window.dash_clientside.no_update,
+                        window.dash_clientside.no_update];
+            }
+            return [
+                timeSeriesFigure(series, base, xaxis, '<b>' + series.player + '</b><br>' + xaxis),
+                timeSeriesFigure(series, base, yaxis, yaxis),
+                timeSeriesFigure(series, base, zaxis, zaxis)
+            ];
+        }
+    }
+});
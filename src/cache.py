@@ -0,0 +1,189 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from plotly.io.json import from_json_plotly, to_json_plotly
+
+import datastore
+import metrics
+
+# default number of entries each cache keeps
+MAXSIZE = int(os.environ.get('FF_CACHE_SIZE', 128))
+
+# path of the sqlite file shared by all the workers on this machine; the disk tier is off when it isn't set
+DISK_CACHE = os.environ.get('FF_DISK_CACHE')
+
+# rows the disk tier keeps before the oldest are pruned
+DISK_CACHE_ROWS = int(os.environ.get('FF_DISK_CACHE_ROWS', 20000))
+
+# every cache created with memoize, by name, so they can be inspected or cleared together
+caches = {}
+
+
+class LRUCache:
+    # a size capped, thread safe mapping that drops the least recently used entry once it is full. entries belong to
+    # the data snapshot they were computed from and are all dropped as soon as a different snapshot is loaded
+    def __init__(self, maxsize=MAXSIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.version = datastore.version
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _check_version(self):
+        if self.version != datastore.version:
+            self._entries.clear()
+            self.version = datastore.version
+
+    def get(self, key, default=None):
+        with self._lock:
+            self._check_version()
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._check_version()
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
+
+
+_missing = object()
+
+
+class DiskCache:
+    # results serialized to JSON in a local sqlite file, so a figure computed by one gunicorn worker can be served by
+    # the others. rows are keyed by the memoized function's name and arguments and tagged with the snapshot version;
+    # rows from any other version are never read and are deleted the first time a new version writes
+    def __init__(self, path, max_rows=DISK_CACHE_ROWS):
+        self.path = path
+        self.max_rows = max_rows
+        self.hits = 0
+        self.misses = 0
+        # [hits, misses] by memoized function name
+        self.names = {}
+        self._local = threading.local()
+        self._writes = 0
+        self._pruned_version = _missing
+
+    def _connection(self):
+        # one connection per thread and per process, as sqlite connections can't be shared across a fork
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS results '
+                               '(key TEXT PRIMARY KEY, version TEXT, value TEXT NOT NULL, created REAL NOT NULL)')
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return self._local.connection
+
+    @staticmethod
+    def _key(name, args):
+        return json.dumps([name, args], default=str)
+
+    def get(self, name, args, default=None):
+        try:
+            row = self._connection().execute('SELECT value FROM results WHERE key = ? AND version IS ?',
+                                             (self._key(name, args), datastore.version)).fetchone()
+        except sqlite3.Error:
+            row = None
+        counts = self.names.setdefault(name, [0, 0])
+        if row is None:
+            self.misses += 1
+            counts[1] += 1
+            return default
+        self.hits += 1
+        counts[0] += 1
+        return from_json_plotly(row[0])
+
+    def set(self, name, args, value):
+        try:
+            connection = self._connection()
+            connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                               (self._key(name, args), datastore.version, to_json_plotly(value), time.time()))
+            self._writes += 1
+            if self._pruned_version != datastore.version or self._writes % 500 == 0:
+                self._prune(connection)
+        except sqlite3.Error:
+            # the disk tier is only an optimisation, a locked or full disk shouldn't fail the callback
+            pass
+
+    def _prune(self, connection):
+        connection.execute('DELETE FROM results WHERE version IS NOT ?', (datastore.version,))
+        connection.execute('DELETE FROM results WHERE key IN '
+                           '(SELECT key FROM results ORDER BY created DESC LIMIT -1 OFFSET ?)', (self.max_rows,))
+        self._pruned_version = datastore.version
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+disk = DiskCache(DISK_CACHE) if DISK_CACHE else None
+
+
+def memoize(name, maxsize=MAXSIZE):
+    # cache a function's result by its (hashable) arguments, e.g. a figure built from dropdown and slider values.
+    # misses in the in-process LRU fall through to the shared disk tier when it is enabled
+    def decorator(func):
+        lru = caches[name] = LRUCache(maxsize)
+
+        @wraps(func)
+        def wrapper(*args):
+            result = lru.get(args, _missing)
+            if result is _missing:
+                if disk is not None:
+                    result = disk.get(name, args, _missing)
+                if result is _missing:
+                    version = datastore.version
+                    result = func(*args)
+                    if version != datastore.version:
+                        # the data was swapped while this ran, so the result can't be trusted to match either version
+                        return result
+                    if disk is not None:
+                        disk.set(name, args, result)
+                lru.set(args, result)
+            return result
+
+        wrapper.cache = lru
+        return wrapper
+
+    return decorator
+
+
+def clear_all():
+    for lru in caches.values():
+        lru.clear()
+
+
+def cache_metrics():
+    # hit and miss counts of every cache for /metrics
+    rows = []
+    for name, lru in caches.items():
+        rows += [('ff_cache_hits_total', {'cache': name, 'tier': 'memory'}, lru.hits),
+                 ('ff_cache_misses_total', {'cache': name, 'tier': 'memory'}, lru.misses)]
+    if disk is not None:
+        for name, (hits, misses) in list(disk.names.items()):
+            rows += [('ff_cache_hits_total', {'cache': name, 'tier': 'disk'}, hits),
+                     ('ff_cache_misses_total', {'cache': name, 'tier': 'disk'}, misses)]
+    return rows
+
+
+metrics.collectors.append(cache_metrics)
@@ -0,0 +1,323 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import metrics
+import profiling
+
+logger = logging.getLogger(__name__)
+
+# snapshots are written by ingest.py and read by the pages at startup, so a worker never has to hit the network
+SNAPSHOT_DIR = os.environ.get('FF_SNAPSHOT_DIR',
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshots'))
+
+# name of the pointer file holding the version of the snapshot the app should serve
+CURRENT = 'CURRENT'
+MANIFEST = 'manifest.json'
+
+# snapshot versions kept on disk; older ones are deleted when a new one is written
+KEEP_SNAPSHOTS = int(os.environ.get('FF_KEEP_SNAPSHOTS', 3))
+
+# build every page's data in a background thread as soon as the app starts, so most visitors never wait for it.
+# FF_WARM_UP=0 leaves each page to load on its first visit
+WARM_UP = os.environ.get('FF_WARM_UP', '1') != '0'
+
+# every page's lazily built data, in the order the pages were imported
+lazies = {}
+
+# version of the snapshot being served, None when the frames are built in process. the caches drop their entries
+# when it changes
+version = None
+
+
+def current_version(snapshot_dir=SNAPSHOT_DIR):
+    try:
+        with open(os.path.join(snapshot_dir, CURRENT)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def read_manifest(version, snapshot_dir=SNAPSHOT_DIR):
+    with open(os.path.join(snapshot_dir, version, MANIFEST)) as f:
+        return json.load(f)
+
+
+def frame_path(version, page, name, snapshot_dir=SNAPSHOT_DIR):
+    return os.path.join(snapshot_dir, version, '{}_{}.feather'.format(page, name))
+
+
+def write_snapshot(frames, years, snapshot_dir=SNAPSHOT_DIR, meta=None):
+    # frames is {page: {frame name: dataframe}}; every snapshot gets its own versioned directory and CURRENT
+    # is only repointed once all of the files are on disk. meta is stored in the manifest as is
+    # microseconds in the version so two writes in the same second (a manual update racing the refresh thread) get
+    # their own directories. an existing directory is never written into: workers may have its files mapped
+    version = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S.%f')
+    os.makedirs(snapshot_dir, exist_ok=True)
+    os.mkdir(os.path.join(snapshot_dir, version))
+
+    manifest = {'version': version, 'years': list(years), 'frames': {}, 'memory': {}, **(meta or {})}
+    for page, page_frames in frames.items():
+        manifest['frames'][page] = {}
+        manifest['memory'][page] = {}
+        for name, df in page_frames.items():
+            compacted = compact(df)
+            # uncompressed and in a single record batch so read_frame can map the columns straight off the file
+            compacted.reset_index(drop=True).to_feather(frame_path(version, page, name, snapshot_dir),
+                                                        compression='uncompressed', chunksize=max(len(df), 1))
+            manifest['frames'][page][name] = len(df)
+            manifest['memory'][page][name] = {'before': int(df.memory_usage(deep=True).sum()),
+                                              'after': int(compacted.memory_usage(deep=True).sum())}
+
+    with open(os.path.join(snapshot_dir, version, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    pointer = os.path.join(snapshot_dir, CURRENT + '.tmp')
+    with open(pointer, 'w') as f:
+        f.write(version)
+    os.replace(pointer, os.path.join(snapshot_dir, CURRENT))
+
+    prune_snapshots(snapshot_dir)
+    return version
+
+
+def prune_snapshots(snapshot_dir=SNAPSHOT_DIR, keep=KEEP_SNAPSHOTS):
+    # workers still serving an older version keep their mapped files readable after they're deleted, so only a few
+    # recent versions need to stay on disk
+    versions = sorted(name for name in os.listdir(snapshot_dir)
+                      if os.path.isfile(os.path.join(snapshot_dir, name, MANIFEST)))
+    for old in versions[:-keep]:
+        if old != current_version(snapshot_dir):
+            shutil.rmtree(os.path.join(snapshot_dir, old), ignore_errors=True)
+
+
+def _compact_column(column):
+    if column.dtype == object:
+        # names, teams, positions and categories repeat on every row, so each is stored once and the rows hold codes
+        return column.astype('category')
+    values = column.to_numpy()
+    if column.dtype.kind == 'f' and np.isfinite(values).all() and np.array_equal(np.round(values), values):
+        # counting stats (and the sums of them) are whole numbers even when they arrive as floats. ratios can be inf
+        # (x / 0), which has no integer, so those columns stay floats
+        return pd.to_numeric(column.astype(np.int64), downcast='integer')
+    if column.dtype.kind in 'iu':
+        return pd.to_numeric(column, downcast='integer')
+    if column.dtype == np.float64 and np.array_equal(values.astype(np.float32), values, equal_nan=True):
+        return column.astype(np.float32)
+    return column
+
+
+def compact(df):
+    # the same frame in the smallest dtypes that hold every value exactly: strings as categoricals, whole numbers as
+    # the narrowest int and other floats as float32 where nothing is lost
+    return pd.DataFrame({name: _compact_column(column) for name, column in df.items()}, index=df.index)
+
+
+def _column(column):
+    # numeric columns without nulls are wrapped over the mapped file as read-only arrays; anything else (strings,
+    # columns with nulls) has to be converted into this worker's own memory
+    if (column.num_chunks == 1 and column.null_count == 0
+            and (pa.types.is_integer(column.type) or pa.types.is_floating(column.type))):
+        return column.chunk(0).to_numpy(zero_copy_only=True)
+    return column.to_pandas()
+
+
+def read_frame(path):
+    # memory mapping the file means every gunicorn worker reads the same pages out of the OS page cache, so adding
+    # workers doesn't add another copy of the numeric data. pd.DataFrame(..., copy=False) keeps the arrays as they are
+    # instead of consolidating them into new blocks
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    return pd.DataFrame({name: _column(column) for name, column in zip(table.column_names, table.columns)},
+                        copy=False)
+
+
+def load(page, snapshot_dir=SNAPSHOT_DIR, version=None):
+    version = version or current_version(snapshot_dir)
+    if version is None:
+        # no snapshot on disk (e.g. a fresh checkout), so fall back to building the frames in process
+        logger.warning('no data snapshot in %s, downloading data for %s; run `python ingest.py` to build one',
+                       snapshot_dir, page)
+        import ingest
+        with profiling.stage('build ' + page):
+            frames = ingest.BUILDERS[page](ingest.SEASONS)
+        with profiling.stage('compact'):
+            return {name: compact(df) for name, df in frames.items()}
+
+    names = read_manifest(version, snapshot_dir)['frames'][page]
+    return {name: read_frame(frame_path(version, page, name, snapshot_dir)) for name in names}
+
+
+class Snapshot:
+    # the frames of one snapshot version, each group read the first time a page asks for it, so pages that share a
+    # group of frames only read it once. a refresh loads a new Snapshot next to the one being served and swaps it in
+    def __init__(self, version, snapshot_dir=SNAPSHOT_DIR):
+        self.version = version
+        self.snapshot_dir = snapshot_dir
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def frames(self, page):
+        with self._lock:
+            if page not in self._frames:
+                with profiling.stage('read ' + page):
+                    self._frames[page] = load(page, self.snapshot_dir, self.version)
+            return self._frames[page]
+
+
+# the snapshot being served
+current = Snapshot(current_version())
+version = current.version
+
+
+def shared(page):
+    return current.frames(page)
+
+
+def partition(df, position):
+    # the position frames are stored sorted by position, so each position is one contiguous block of rows
+    # and slicing it out gives a view rather than a filtered copy
+    positions = df['position']
+    if isinstance(positions.dtype, pd.CategoricalDtype) and positions.cat.categories.is_monotonic_increasing:
+        # sorted categories have codes in the same order as the names, so search the codes instead
+        categories = positions.cat.categories
+        position = categories.get_loc(position) if position in categories else -2
+        positions = positions.cat.codes
+    positions = positions.to_numpy()
+    start, stop = np.searchsorted(positions, position, 'left'), np.searchsorted(positions, position, 'right')
+    return df.iloc[start:stop]
+
+
+@profiling.timed('position_frames')
+def position_frames(position, snapshot=None):
+    return {name: partition(df, position) for name, df in (snapshot or current).frames('positions').items()}
+
+
+@profiling.timed('season_store')
+def season_store(season):
+    # split the wide season totals by (position, season) up front, so a scatter callback picks its rows with one dict
+    # lookup and each axis is a column of the same frame. groupby keeps the row order within each group, and observed
+    # skips the combinations of categories that have no rows
+    return {key: group.reset_index(drop=True) for key, group in season.groupby(['position', 'season'], sort=False, observed=True)}
+
+
+class PlayerIndex:
+    # the row positions of every player in a frame, built once so a callback can pull out one player's rows without
+    # comparing every name in the frame. rows come back in the same order as the frame
+    def __init__(self, df, column):
+        self.df = df
+        with profiling.stage('player_index'):
+            self.positions = df.groupby(column, sort=False, observed=True).indices
+
+    def rows(self, player):
+        return self.df.take(self.positions.get(player, np.empty(0, dtype=np.intp)))
+
+
+@profiling.timed('player_records')
+def player_records(df, column, columns=None):
+    # every player's season rows, sorted by season and already converted to the list of records a DataTable takes,
+    # so the stats table callbacks don't pivot, sort or convert anything per request
+    df = df.sort_values('season', kind='stable')
+    records = (df if columns is None else df[columns]).to_dict('records')
+    return {player: [records[i] for i in positions]
+            for player, positions in df.groupby(column, sort=False, observed=True).indices.items()}
+
+
+class Lazy:
+    # a page's frames and indexes, built from the current snapshot the first time a callback or layout asks for them
+    # rather than when the page module is imported. the lock makes sure concurrent requests wait for one build instead
+    # of starting their own
+    def __init__(self, name, build):
+        self.name = name
+        self._build = build
+        # (snapshot, value) so the value and the snapshot it was built from are always read together
+        self._value = None
+        self._lock = threading.Lock()
+        self._started = False
+        lazies[name] = self
+
+    def ready(self):
+        return self._value is not None
+
+    def build(self, snapshot):
+        started = time.perf_counter()
+        with profiling.stage(self.name):
+            value = self._build(snapshot)
+        metrics.observe('ff_data_load_duration_seconds', {'page': self.name}, time.perf_counter() - started)
+        return value
+
+    def get(self):
+        value = self._value
+        if value is None or value[0] is not current:
+            with self._lock:
+                if self._value is None or self._value[0] is not current:
+                    snapshot = current
+                    self._value = (snapshot, self.build(snapshot))
+                value = self._value
+        return value[1]
+
+    def _load(self):
+        try:
+            self.get()
+        except Exception:
+            logger.exception('failed to load the data for %s', self.name)
+
+    def start(self):
+        # build in a background thread without waiting for it, for a layout that shows a loading state meanwhile
+        if not self._started and not self.ready():
+            self._started = True
+            threading.Thread(target=self._load, name='load-' + self.name, daemon=True).start()
+
+
+def warm_up():
+    # load every page's data one after another off the request path
+    def run():
+        for lazy in list(lazies.values()):
+            lazy._load()
+        profiling.finish()
+
+    thread = threading.Thread(target=run, name='warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+def ready():
+    return {name: lazy.ready() for name, lazy in lazies.items()}
+
+
+def swap(snapshot):
+    # rebuild every page that has loaded from the new snapshot while the old one keeps serving, then switch them all
+    # over at once. requests see either the old frames or the new ones, never a mix or a half built frame, and the
+    # version moves last so nothing computed from the old frames is cached under the new version
+    global current, version
+    loaded = [lazy for lazy in lazies.values() if lazy.ready()]
+    values = {lazy.name: lazy.build(snapshot) for lazy in loaded}
+
+    locks = [lazy._lock for lazy in lazies.values()]
+    for lock in locks:
+        lock.acquire()
+    try:
+        for lazy in loaded:
+            lazy._value = (snapshot, values[lazy.name])
+        current = snapshot
+    finally:
+        for lock in reversed(locks):
+            lock.release()
+    version = snapshot.version
+    logger.info('now serving data snapshot %s', version)
+
+
+def reload(snapshot_dir=SNAPSHOT_DIR):
+    # swap in the snapshot CURRENT points at, if it isn't the one being served
+    latest = current_version(snapshot_dir)
+    if latest is None or latest == current.version:
+        return False
+    swap(Snapshot(latest, snapshot_dir))
+    return True
@@ -0,0 +1,150 @@
+import base64
+import os
+
+import numpy as np
+import pandas as pd
+from dash import Patch
+
+# draw the time series in the browser (assets/timeseries.js) from a compact payload of the current player's stats,
+# so hovering across the scatter or changing an axis doesn't need the server to build three figures.
+# FF_CLIENTSIDE_TIMESERIES=0 goes back to building them on the server
+CLIENTSIDE_TIMESERIES = os.environ.get('FF_CLIENTSIDE_TIMESERIES', '1') != '0'
+
+# send figures with their numbers as typed arrays, rounded, and only the parts of the template they use, and table
+# rows rounded. FF_COMPACT_FIGURES=0 sends them as plotly and pandas make them
+COMPACT = os.environ.get('FF_COMPACT_FIGURES', '1') != '0'
+
+# decimal places the stats are sent with
+PRECISION = 2
+
+# the integer types plotly.js reads typed arrays of, smallest first
+INTEGER_TYPES = ('i1', 'u1', 'i2', 'u2', 'i4', 'u4')
+
+# template layout defaults that only apply to a figure whose layout has the matching key
+TEMPLATE_OPTIONAL = ('xaxis', 'yaxis', 'scene', 'polar', 'ternary', 'geo', 'mapbox', 'map', 'coloraxis', 'colorscale',
+                     'shapedefaults', 'annotationdefaults')
+
+
+def numbers(values):
+    # values of a trace property as a numpy array, or None when they aren't numbers (names, dates)
+    if isinstance(values, dict) and 'bdata' in values:
+        return np.frombuffer(base64.b64decode(values['bdata']), dtype=values['dtype'])
+    values = np.asarray(values)
+    return values if values.ndim == 1 and values.dtype.kind in 'iuf' else None
+
+
+def rounded_values(values, precision=PRECISION):
+    # floats rounded to precision, as integers when they are all whole numbers (counts summed as float32)
+    values = np.asarray(values)
+    if values.dtype.kind != 'f':
+        return values
+    values = np.round(values.astype(np.float64), precision)
+    if len(values) and np.isfinite(values).all() and (values == np.trunc(values)).all():
+        return values.astype(np.int64)
+    return values
+
+
+def typed_array(values, precision=PRECISION):
+    # numbers as a base64 typed array, which plotly.js reads without parsing every number: whole numbers in the
+    # smallest integer type that holds them, anything else rounded to precision and sent as float32
+    values = rounded_values(values, precision)
+    if values.dtype.kind in 'iu':
+        low, high = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+        dtype = next((t for t in INTEGER_TYPES if np.iinfo(t).min <= low and high <= np.iinfo(t).max), 'f8')
+    else:
+        dtype = 'f4'
+    return {'dtype': dtype, 'bdata': base64.b64encode(values.astype('<' + dtype).tobytes()).decode()}
+
+
+def trim_template(template, layout, traces):
+    # the default template has defaults for every trace type and subplot plotly has; keep the ones for the figure's
+    # trace types and the axes or scenes its layout has
+    template = template.to_plotly_json() if hasattr(template, 'to_plotly_json') else dict(template)
+    used = {key.rstrip('0123456789') for key in layout}
+    used |= {default for key, default in (('annotations', 'annotationdefaults'), ('shapes', 'shapedefaults'),
+                                          ('coloraxis', 'colorscale')) if key in used}
+    kept = {key: value for key, value in template.get('layout', {}).items()
+            if key not in TEMPLATE_OPTIONAL or key in used}
+    return {'data': {t: v for t, v in template.get('data', {}).items() if t in traces}, 'layout': kept}
+
+
+def compact(fig):
+    # a figure as the dict plotly.js draws, made smaller: every numeric array a typed array, names shown on hover
+    # sent once (as customdata, which the hover callbacks read) rather than also as hovertext, and the template cut
+    # down to what the figure uses
+    if not COMPACT:
+        return fig
+    figure = fig.to_plotly_json() if hasattr(fig, 'to_plotly_json') else dict(fig)
+    data = []
+    for trace in figure.get('data', []):
+        trace = dict(trace)
+        for key in ('x', 'y', 'z'):
+            values = numbers(trace[key]) if key in trace else None
+            if values is not None:
+                trace[key] = typed_array(values)
+        hovertext, customdata = trace.get('hovertext'), trace.get('customdata')
+        if (hovertext is not None and customdata is not None and '%{hovertext}' in trace.get('hovertemplate', '')
+                and np.array_equal(np.asarray(hovertext, dtype=object), np.asarray(customdata, dtype=object))):
+            del trace['hovertext']
+            trace['hovertemplate'] = trace['hovertemplate'].replace('%{hovertext}', '%{customdata}')
+        if customdata is not None and not isinstance(customdata, list):
+            trace['customdata'] = np.asarray(customdata).tolist()
+        data.append(trace)
+
+    layout = dict(figure.get('layout', {}))
+    if 'template' in layout:
+        layout['template'] = trim_template(layout['template'], layout, {t.get('type', 'scatter') for t in data})
+    return {'data': data, 'layout': layout}
+
+
+def rounded(df, precision=PRECISION):
+    # float stats rounded for display, so table rows don't carry float32 noise like 111.69999694824219 or a trailing
+    # .0 on every count
+    if not COMPACT:
+        return df
+    return df.assign(**{c: rounded_values(df[c].to_numpy(), precision) for c in df.columns if df[c].dtype.kind == 'f'})
+
+
+def series_payload(player_name, rows, x, group=None):
+    # one player's rows of a melted frame as columns: the x values (and the season each point belongs to when the
+    # series is split by season) once, then one list of values per category. only the player is needed when the
+    # figures are drawn on the server
+    payload = {'player': player_name}
+    if not CLIENTSIDE_TIMESERIES:
+        return payload
+
+    payload.update({'x': [], 'values': {}})
+    if group is not None:
+        payload['group'] = []
+    for i, (category, block) in enumerate(rows.groupby('Category', sort=False, observed=True)):
+        # numpy arrays rather than lists, which orjson encodes without looking at every number
+        if i == 0:
+            payload['x'] = block[x].to_numpy()
+            if group is not None:
+                payload['group'] = block[group].to_numpy()
+        values = block['value'].to_numpy()
+        payload['values'][category] = rounded_values(values) if COMPACT else values
+    return payload
+
+
+def time_series_layout(create_time_series, x, group=None):
+    # the layout (template, axes, margins) every time series on a page shares, taken from the server side figure so
+    # both modes look the same. it goes into the page layout once and the browser only fills in the traces and title
+    columns = [x, 'value'] + ([group] if group is not None else [])
+    layout = create_time_series(pd.DataFrame(columns=columns), '').layout.to_plotly_json()
+    if COMPACT:
+        # the browser draws scatter traces and the title annotation with it
+        layout['template'] = trim_template(layout['template'], layout, {'scatter'})
+    layout.pop('annotations', None)
+    if group is not None:
+        layout.setdefault('legend', {})['title'] = {'text': group}
+    return {'layout': layout, 'x': x, 'group': group}
+
+
+def scatter_axis_patch(axis, values, title):
+    # changing one axis dropdown keeps the same players in the same order, so only that axis' coordinates and title
+    # need to go to the browser instead of the whole figure
+    patch = Patch()
+    patch['data'][0][axis] = typed_array(values) if COMPACT else values
+    patch['layout']['scene'][axis + 'axis']['title']['text'] = title
+    return patch
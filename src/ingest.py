@@ -0,0 +1,284 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import datastore
+import profiling
+import sources
+
+# seasons pulled into the snapshot
+SEASONS = [2019, 2020, 2021, 2022, 2023]
+
+PASSING_STATS = ['completions', 'attempts', 'passing_yards', 'passing_tds', 'interceptions', 'sacks',
+                 'fantasy_points', 'fantasy_points_ppr']
+
+SKILL_STATS = ['carries', 'rushing_yards', 'rushing_tds', 'rushing_fumbles', 'rushing_first_downs',
+               'receptions', 'targets', 'receiving_yards', 'receiving_tds', 'receiving_air_yards',
+               'receiving_yards_after_catch', 'receiving_first_downs', 'fantasy_points', 'fantasy_points_ppr']
+
+# identifying columns kept from the weekly data for every position
+WEEKLY_COLUMNS = ['player_display_name', 'position', 'season_type', 'season', 'week', 'recent_team', 'opponent_team']
+
+# version of the frames' layout, stored in the manifest. update rebuilds from scratch rather than appending to a
+# snapshot written with a different one
+FORMAT = 2
+
+# ratios added to the home season totals: name: (numerator, denominator)
+HOME_RATIOS = {
+    'yards_per_attempt': ('rushing_yards', 'carries'),
+    'fp_per_game': ('fantasy_points', 'games'),
+    'fp_ppr_per_game': ('fantasy_points_ppr', 'games'),
+}
+
+# weekly stats and the minimum season total a player needs to show up on each position page
+POSITIONS = {
+    'QB': {'stats': PASSING_STATS, 'minimum': ('attempts', 100)},
+    'RB': {'stats': SKILL_STATS, 'minimum': ('carries', 100)},
+    'WR': {'stats': SKILL_STATS, 'minimum': ('receptions', 20)},
+    'TE': {'stats': SKILL_STATS, 'minimum': ('receptions', 20)},
+}
+
+
+def build_home(years):
+    # bring in nfl play data for the previous seasons
+    pbp_rp = sources.active().import_seasonal_data(years)
+
+    # filter down to use only needed stats
+    player_stats = pbp_rp.filter(items=['player_id', 'season', 'games', 'completions', 'attempts',
+                                        'passing_yards', 'passing_tds', 'interceptions', 'sacks', 'carries', 'rushing_yards',
+                                        'rushing_tds', 'receptions', 'targets', 'receiving_yards', 'receiving_tds', 'receiving_yards_after_catch',
+                                        'fantasy_points', 'fantasy_points_ppr'])
+
+    # grab player information to link position and display name to the season stats, then filter that data down
+    player_index = sources.active().import_players()
+    player_index = player_index.filter(items=['display_name', 'position', 'gsis_id'])
+
+    player_index.rename(columns={'gsis_id': 'player_id'}, inplace=True)
+
+    # join the season stats data and the player info data
+    player_stats = player_stats.merge(player_index, how='left', on='player_id')
+    player_stats = add_ratios(player_stats, HOME_RATIOS)
+
+    # filter out for minium receptions
+    player_stats = player_stats[(player_stats['attempts'] >= 100) | (player_stats['carries'] >= 50) | (player_stats['receptions'] >= 10)]
+
+    player_stats = player_stats.filter(items=['display_name', 'position', 'season', 'games', 'completions', 'attempts',
+                                              'passing_yards', 'passing_tds', 'interceptions', 'sacks', 'carries', 'rushing_yards', 'rushing_tds', 'yards_per_attempt',
+                                              'receptions', 'targets', 'receiving_yards', 'receiving_tds',
+                                              'receiving_yards_after_catch', 'fantasy_points', 'fp_per_game', 'fantasy_points_ppr', 'fp_ppr_per_game'])
+
+    player_stats = player_stats.sort_values(['display_name', 'season'])
+
+    # unpivot the data in order to render graph axis with selected categories
+    dfr = player_stats.melt(id_vars=['season', 'display_name', 'position'],
+                            var_name='Category',
+                            value_vars=['games', 'completions', 'attempts',
+                                        'passing_yards', 'passing_tds', 'interceptions', 'sacks', 'carries', 'rushing_yards', 'rushing_tds', 'yards_per_attempt',
+                                        'receptions', 'targets', 'receiving_yards', 'receiving_tds',
+                                        'receiving_yards_after_catch', 'fantasy_points', 'fantasy_points_ppr'])
+
+    return {'player_stats': player_stats, 'dfr': dfr}
+
+
+def add_ratios(df, ratios):
+    # every ratio column in one assign, straight from the column arrays. x/0 is inf and 0/0 NaN, as with pandas
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return df.assign(**{name: df[numerator].to_numpy() / df[denominator].to_numpy()
+                            for name, (numerator, denominator) in ratios.items()})
+
+
+def week_key(season, week):
+    # season * 100 + week orders the weeks of every season the way they were played, as one integer
+    return season.to_numpy().astype(np.int32) * 100 + week.to_numpy().astype(np.int32)
+
+
+def player_week_order(names, keys):
+    # row order by player name, then week key. the names are ranked once (missing ones last, as sort_values puts
+    # them) so the sort itself only compares integers
+    codes, uniques = pd.factorize(names, sort=True)
+    codes = np.where(codes < 0, len(uniques), codes)
+    return np.lexsort((keys, codes))
+
+
+@profiling.timed('position_weeks')
+def position_weeks(weekly, position):
+    # one position's weekly rows with the columns the pages sort and plot by, in player and week order
+    stats = POSITIONS[position]['stats']
+
+    player_stats = weekly.loc[weekly['position'] == position, WEEKLY_COLUMNS + stats]
+    player_stats = player_stats.assign(games=1, week_key=week_key(player_stats['season'], player_stats['week']))
+
+    return player_stats.take(player_week_order(player_stats['player_display_name'], player_stats['week_key']))
+
+
+@profiling.timed('pivot_table')
+def season_totals(player_stats, position):
+    # per player season totals of a position's weekly rows, unpivoted for the time series and wide for the scatter
+    stats = POSITIONS[position]['stats']
+    minimum_stat, minimum = POSITIONS[position]['minimum']
+
+    dfr = player_stats.pivot_table(index=['player_display_name', 'position', 'season', 'season_type'], values=['games'] + stats,
+                                   aggfunc='sum')
+
+    dfr = dfr.dropna()
+    dfr.reset_index(inplace=True)
+
+    dfr = dfr[dfr[minimum_stat] >= minimum]
+    # keep the season totals in wide form as well, for the scatter plots
+    season = dfr.filter(items=['season', 'player_display_name', 'position', 'games'] + stats)
+    # unpivot the data in order to render graph axis with selected categories
+    dfr = dfr.melt(id_vars=['season', 'player_display_name', 'position'],
+                   var_name='Category',
+                   value_vars=['games'] + stats)
+
+    return dfr, season
+
+
+@profiling.timed('melt')
+def melt_weeks(player_stats, position):
+    return player_stats.melt(id_vars=['season', 'week', 'player_display_name', 'position', 'recent_team', 'opponent_team', 'week_key'],
+                             var_name='Category',
+                             value_vars=POSITIONS[position]['stats'])
+
+
+def build_position(weekly, position):
+    with profiling.stage(position):
+        player_stats = position_weeks(weekly, position)
+        dfr, season = season_totals(player_stats, position)
+        return {'player_stats': melt_weeks(player_stats, position), 'dfr': dfr, 'season': season}
+
+
+@profiling.timed('download weekly')
+def fetch_weekly(years):
+    # bring in nfl play data for the seasons once, with every stat any of the position pages needs
+    stats = list(dict.fromkeys(stat for config in POSITIONS.values() for stat in config['stats']))
+    weekly = sources.active().import_weekly_data(years=years, columns=WEEKLY_COLUMNS + stats, downcast=True)
+
+    return weekly.loc[weekly['position'].isin(list(POSITIONS)) & (weekly['season_type'] == 'REG')]
+
+
+def build_positions(years, weekly=None):
+    if weekly is None:
+        weekly = fetch_weekly(years)
+
+    # stack the positions one after the other, in sorted order, so the app can slice each one back out without copying
+    positions = [build_position(weekly, position) for position in sorted(POSITIONS)]
+    return {name: pd.concat([frames[name] for frames in positions], ignore_index=True)
+            for name in ('player_stats', 'dfr', 'season')}
+
+
+def last_week(weekly):
+    # the latest (season, week) in the weekly data, which the next incremental update fetches from
+    if weekly.empty:
+        return None
+    season = weekly['season'].max()
+    return [int(season), int(weekly.loc[weekly['season'] == season, 'week'].max())]
+
+
+def player_seasons(df):
+    return pd.MultiIndex.from_frame(df[['player_display_name', 'season']])
+
+
+def merge_positions(old, new_weeks, affected_weeks):
+    # the stored position frames with the new weeks appended and the season totals of every player season those
+    # weeks touched rebuilt. each position keeps its own block, and within it the changed rows go after the stored
+    # ones, which are all from earlier weeks, so every player's rows stay in week and season order
+    merged = {name: [] for name in ('player_stats', 'dfr', 'season')}
+    for position in sorted(POSITIONS):
+        affected = position_weeks(affected_weeks, position)
+        dfr, season = season_totals(affected, position)
+        changed = player_seasons(affected).unique()
+
+        merged['player_stats'] += [datastore.partition(old['player_stats'], position),
+                                   melt_weeks(position_weeks(new_weeks, position), position)]
+        for name, rows in (('dfr', dfr), ('season', season)):
+            block = datastore.partition(old[name], position)
+            merged[name] += [block[~player_seasons(block).isin(changed)], rows]
+
+    return {name: pd.concat(parts, ignore_index=True) for name, parts in merged.items()}
+
+
+def merge_home(old, new, seasons):
+    # the home frames are season totals, so the seasons being updated are replaced wholesale
+    return {name: pd.concat([df[~df['season'].isin(seasons)], new[name]], ignore_index=True)
+            for name, df in old.items()}
+
+
+# one builder per group of frames, keyed the same way as the snapshot files
+BUILDERS = {
+    'home': build_home,
+    'positions': build_positions,
+}
+
+
+def run(years, snapshot_dir=datastore.SNAPSHOT_DIR):
+    # build every group of frames and write them out as a new snapshot. the filtered weekly data is kept in the
+    # snapshot too (the pages never load it) so update can rebuild totals without downloading every season again
+    weekly = fetch_weekly(years)
+    frames = {'home': build_home(years), 'positions': build_positions(years, weekly), 'weekly': {'weekly': weekly}}
+    return frames, datastore.write_snapshot(frames, years, snapshot_dir,
+                                            {'format': FORMAT, 'last_week': last_week(weekly)})
+
+
+def update(years, snapshot_dir=datastore.SNAPSHOT_DIR):
+    # add whatever weeks were played since the current snapshot was written. nflverse publishes the weekly data a
+    # season at a time, so only the seasons from the last stored one on are downloaded, and only the player seasons
+    # with new weeks are rebuilt. returns (None, None) when there is nothing new
+    version = datastore.current_version(snapshot_dir)
+    manifest = datastore.read_manifest(version, snapshot_dir) if version else {}
+    if manifest.get('format') != FORMAT or not manifest.get('last_week') or \
+            any(year not in manifest['years'] and year < manifest['last_week'][0] for year in years):
+        # no snapshot yet, one with frames laid out differently or written before weeks were tracked, or an earlier
+        # season was added. the rebuild keeps the stored seasons as well as the requested ones
+        return run(sorted(set(manifest.get('years', [])) | set(years)), snapshot_dir)
+
+    last_season, last = manifest['last_week']
+    fetched = [year for year in years if year >= last_season]
+    weekly = fetch_weekly(fetched)
+    new_weeks = weekly[(weekly['season'] > last_season) | (weekly['week'] > last)]
+    if new_weeks.empty:
+        return None, None
+
+    stored = datastore.load('weekly', snapshot_dir, version)['weekly']
+    weekly = pd.concat([stored, new_weeks], ignore_index=True)
+    affected_weeks = weekly[player_seasons(weekly).isin(player_seasons(new_weeks).unique())]
+
+    frames = {
+        'home': merge_home(datastore.load('home', snapshot_dir, version), build_home(fetched), fetched),
+        'positions': merge_positions(datastore.load('positions', snapshot_dir, version), new_weeks, affected_weeks),
+        'weekly': {'weekly': weekly},
+    }
+    years = sorted(set(manifest['years']) | set(years))
+    return frames, datastore.write_snapshot(frames, years, snapshot_dir,
+                                            {'format': FORMAT, 'last_week': last_week(weekly)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Download nflverse data (or another source) and write a local snapshot for the app to load.')
+    parser.add_argument('--years', type=int, nargs='+', default=SEASONS, help='seasons to ingest')
+    parser.add_argument('--out', default=datastore.SNAPSHOT_DIR, help='snapshot directory')
+    parser.add_argument('--update', action='store_true',
+                        help='only add the weeks played since the current snapshot instead of rebuilding it')
+    parser.add_argument('--source', default=sources.DATA_SOURCE,
+                        help="where the data comes from: nflverse, fixture[:players=N,weeks=N] or replay:<dir>")
+    args = parser.parse_args()
+
+    sources.use(args.source)
+
+    frames, version = (update if args.update else run)(args.years, args.out)
+    if version is None:
+        print('no new weeks since snapshot {}'.format(datastore.current_version(args.out)))
+        return
+
+    memory = datastore.read_manifest(version, args.out)['memory']
+    for page, page_frames in frames.items():
+        print('{}: {}'.format(page, ', '.join('{} {} rows'.format(name, len(df)) for name, df in page_frames.items())))
+        for name, usage in memory[page].items():
+            print('  {} {:.1f} MB -> {:.1f} MB in memory ({:.1f}x smaller)'.format(
+                name, usage['before'] / 1e6, usage['after'] / 1e6, usage['before'] / max(usage['after'], 1)))
+    print('wrote snapshot {} to {}'.format(version, args.out))
+
+
+if __name__ == '__main__':
+    main()
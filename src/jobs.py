@@ -0,0 +1,57 @@
+import os
+import tempfile
+
+from dash import callback
+
+import datastore
+
+# heavy analytics callbacks run as dash background callbacks: each job in its own process, so a long computation
+# doesn't hold one of the gunicorn worker's threads, with its progress and result kept in a diskcache directory.
+# FF_BACKGROUND_JOBS=0 runs them on the request thread like any other callback
+BACKGROUND_JOBS = os.environ.get('FF_BACKGROUND_JOBS', '1') != '0'
+
+# directory of the job cache; every worker on the machine has to use the same one, so a job started by one worker
+# can be polled, cancelled or answered from the cache by any other
+JOBS_DIR = os.environ.get('FF_JOBS_DIR', os.path.join(tempfile.gettempdir(), 'ff-jobs'))
+
+# seconds a job's result is kept after it was last read
+JOBS_EXPIRE = int(os.environ.get('FF_JOBS_EXPIRE', 24 * 60 * 60))
+
+
+def snapshot_version():
+    return datastore.version
+
+
+def manager():
+    # the app's background callback manager, or None when background jobs are off. results are cached by the
+    # callback's arguments and the snapshot version, so the same analysis of the same data is read from disk instead
+    # of being run again, and a refresh makes every cached result stale
+    if not BACKGROUND_JOBS:
+        return None
+    try:
+        import diskcache
+    except ImportError as e:
+        raise ImportError('background jobs need dash[diskcache] (see requirements.txt); set FF_BACKGROUND_JOBS=0 to run '
+                          'heavy callbacks on the request thread instead') from e
+    from dash import DiskcacheManager
+    return DiskcacheManager(diskcache.Cache(JOBS_DIR), cache_by=[snapshot_version], expire=JOBS_EXPIRE)
+
+
+def background_callback(*args, progress=None, progress_default=None, cancel=None, running=None,
+                        cache_args_to_ignore=None, **kwargs):
+    # dash.callback for a heavy callback. the function takes a set_progress function first, then the callback's
+    # values; with background jobs off it runs in the request and set_progress does nothing
+    def decorator(func):
+        if BACKGROUND_JOBS:
+            return callback(*args, background=True, progress=progress, progress_default=progress_default,
+                            cancel=cancel, running=running, cache_args_to_ignore=cache_args_to_ignore,
+                            **kwargs)(func)
+
+        def inline(*values):
+            return func(lambda *_: None, *values)
+
+        # metrics labels callbacks by the function's module and name
+        inline.__module__, inline.__name__ = func.__module__, func.__name__
+        return callback(*args, running=running, **kwargs)(inline)
+
+    return decorator
@@ -0,0 +1,157 @@
+import math
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+from dash import dash_table
+from dash.dash_table.Format import Format, Scheme, Trim
+
+# rows a leaderboard page shows
+PAGE_SIZE = 20
+
+# one clause of a DataTable filter_query, e.g. {passing_yards} >= 3000 or {player_display_name} icontains "mah".
+# the table joins the clauses of different columns with &&
+CLAUSE = re.compile(r'^\s*\{(?P<column>[^}]+)\}\s+(?P<case>[is]?)(?P<op>contains|datestartswith|eq|ne|lt|le|gt|ge|'
+                    r'<=|>=|!=|<|>|=)\s+(?P<value>.+?)\s*$')
+
+OPERATORS = {'eq': '=', 'ne': '!=', 'lt': '<', 'le': '<=', 'gt': '>', 'ge': '>='}
+
+COMPARE = {
+    '=': np.equal, '!=': np.not_equal, '<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal,
+}
+
+
+def parse_filter(query):
+    # [(column, operator, value string, case sensitive)] for every clause of a filter_query. clauses the table can
+    # write but this doesn't understand (is blank and the like) are left out rather than failing the whole query
+    clauses = []
+    for part in (query or '').split(' && '):
+        match = CLAUSE.match(part)
+        if match is None:
+            continue
+        value = match['value']
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'`':
+            value = value[1:-1].replace('\\' + value[0], value[0])
+        clauses.append((match['column'], OPERATORS.get(match['op'], match['op']), value, match['case'] != 'i'))
+    return clauses
+
+
+def _text_mask(values, op, value, case):
+    # values is an array of strings (a column's categories), so each distinct string is only compared once
+    strings = pd.Series(values, dtype=object).astype(str)
+    value = str(value)
+    if not case:
+        strings, value = strings.str.lower(), value.lower()
+    if op == 'contains':
+        return strings.str.contains(value, regex=False).to_numpy()
+    if op == 'datestartswith':
+        return strings.str.startswith(value).to_numpy()
+    return COMPARE[op](strings.to_numpy(), value)
+
+
+def _own_categories(df):
+    # a season's rows keep the categories of the whole frame (every player of every season), so a text filter
+    # would compare all of them; keep only the ones the season uses
+    return df.assign(**{c: df[c].cat.remove_unused_categories() for c in df.columns
+                        if isinstance(df[c].dtype, pd.CategoricalDtype)})
+
+
+class Leaderboard:
+    # every player season of a page's season totals, for a table sorted, filtered and paged on the server. each
+    # season's rows are kept together, and the row order for sorting a season by a column is built the first time
+    # it is asked for and kept, so a sort or a page turn only has to filter and slice
+    def __init__(self, df, columns):
+        self.columns = columns
+        self.seasons = {season: _own_categories(df.take(rows)[columns].reset_index(drop=True))
+                        for season, rows in df.groupby('season', sort=True, observed=True).indices.items()}
+        self._orders = {}
+        self._lock = threading.Lock()
+
+    def column_types(self):
+        # text or numeric, so the table's filters compare numbers as numbers. fractional stats (summed float32
+        # points) are shown to two decimals
+        df = next(iter(self.seasons.values()))
+        columns = []
+        for c in self.columns:
+            column = {'id': c, 'name': c, 'type': 'numeric' if pd.api.types.is_numeric_dtype(df[c]) else 'text'}
+            if df[c].dtype.kind == 'f':
+                column['format'] = Format(precision=2, scheme=Scheme.fixed, trim=Trim.yes)
+            columns.append(column)
+        return columns
+
+    def order(self, season, column, descending):
+        # positions of a season's rows sorted by a column, ties kept in name order and missing values last either way
+        key = (season, column, descending)
+        order = self._orders.get(key)
+        if order is None:
+            values = self.seasons[season][column]
+            if isinstance(values.dtype, pd.CategoricalDtype) or not pd.api.types.is_numeric_dtype(values):
+                codes, _ = pd.factorize(values, sort=True)
+                values = np.where(codes < 0, np.nan, codes)
+            else:
+                values = values.to_numpy(dtype=np.float64)
+            order = np.argsort(-values if descending else values, kind='stable')
+            with self._lock:
+                self._orders[key] = order
+        return order
+
+    def mask(self, season, clauses):
+        df = self.seasons[season]
+        mask = np.ones(len(df), dtype=bool)
+        for column, op, value, case in clauses:
+            if column not in df.columns:
+                continue
+            values = df[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                # compare the categories once, then look every row's result up by its code (missing rows are -1)
+                matches = _text_mask(values.cat.categories, op, value, case)
+                mask &= np.append(matches, False)[values.cat.codes.to_numpy()]
+            elif op in COMPARE and pd.api.types.is_numeric_dtype(values):
+                try:
+                    mask &= COMPARE[op](values.to_numpy(), float(value))
+                except ValueError:
+                    # a number column compared to something that isn't a number matches nothing
+                    mask[:] = False
+            else:
+                mask &= _text_mask(values.to_numpy(), op, value, case)
+        return mask
+
+    def page(self, season, page_current, page_size, sort_by, filter_query):
+        # one page of the season's rows as table records, and the number of pages the filtered rows make
+        if season not in self.seasons:
+            return [], 1
+        if sort_by:
+            order = self.order(season, sort_by[0]['column_id'], sort_by[0]['direction'] == 'desc')
+        else:
+            order = np.arange(len(self.seasons[season]))
+        clauses = parse_filter(filter_query)
+        if clauses:
+            order = order[self.mask(season, clauses)[order]]
+
+        page_size = page_size or PAGE_SIZE
+        start = (page_current or 0) * page_size
+        rows = self.seasons[season].take(order[start:start + page_size])
+        return rows.to_dict('records'), max(1, math.ceil(len(order) / page_size))
+
+
+def table(id, columns, sort_by):
+    # a DataTable that leaves paging, sorting and filtering to a callback on the server
+    return dash_table.DataTable(
+        id=id,
+        columns=columns,
+        page_current=0,
+        page_size=PAGE_SIZE,
+        page_action='custom',
+        sort_action='custom',
+        sort_mode='single',
+        sort_by=sort_by,
+        filter_action='custom',
+        filter_query='',
+        fixed_columns={'headers': True, 'data': 2},
+        style_table={'minWidth': '100%'},
+        style_cell={
+            'minWidth': '140px', 'width': '140px', 'maxWidth': '140px',
+            'overflow': 'hidden',
+            'textOverflow': 'ellipsis',
+        })
@@ -0,0 +1,194 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+from flask import Response, g, request
+
+# directory every gunicorn worker writes its metrics to, so /metrics can answer for all of them whichever worker
+# takes the scrape. when it isn't set each worker only reports its own
+METRICS_DIR = os.environ.get('FF_METRICS_DIR')
+
+# seconds between a worker's writes to METRICS_DIR
+WRITE_INTERVAL = float(os.environ.get('FF_METRICS_INTERVAL', 5))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+LOAD_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    'ff_callback_requests_total': ('counter', 'Callback requests by page, callback and HTTP status.', None),
+    'ff_callback_duration_seconds': ('histogram', 'Time to answer a callback request.', LATENCY_BUCKETS),
+    'ff_callback_response_bytes': ('histogram', 'Size of callback responses.', SIZE_BUCKETS),
+    'ff_cache_hits_total': ('counter', 'Memoized results found in a cache, by cache and tier.', None),
+    'ff_cache_misses_total': ('counter', 'Memoized results not found in a cache, by cache and tier.', None),
+    'ff_data_load_duration_seconds': ('histogram', 'Time to build a page\'s data from a snapshot.', LOAD_BUCKETS),
+}
+
+# functions returning [(metric, labels, value)] for counters kept elsewhere, read at every scrape
+collectors = []
+
+_counters = {}
+_histograms = {}
+_lock = threading.Lock()
+_written = 0
+
+
+def _key(metric, labels):
+    return metric, tuple(sorted(labels.items()))
+
+
+def inc(metric, labels, amount=1):
+    key = _key(metric, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+    _maybe_write()
+
+
+def observe(metric, labels, value):
+    buckets = METRICS[metric][2]
+    key = _key(metric, labels)
+    with _lock:
+        # per bucket (not cumulative) counts, then the +Inf bucket, the sum and the count
+        counts = _histograms.setdefault(key, [0] * (len(buckets) + 3))
+        counts[next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))] += 1
+        counts[-2] += value
+        counts[-1] += 1
+    _maybe_write()
+
+
+def state():
+    # this process' metrics, with the collected counters, in a form that can be written as JSON and summed
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: list(counts) for key, counts in _histograms.items()}
+    for collect in collectors:
+        for metric, labels, value in collect():
+            counters[_key(metric, labels)] = value
+    return {'counters': [[metric, labels, value] for (metric, labels), value in counters.items()],
+            'histograms': [[metric, labels, counts] for (metric, labels), counts in histograms.items()]}
+
+
+def _path(pid):
+    return os.path.join(METRICS_DIR, '{}.json'.format(pid))
+
+
+def write():
+    # written whole and renamed into place, so a scrape never reads half a file. a worker that exits leaves its file
+    # behind, so the totals across workers don't go backwards when gunicorn replaces one
+    global _written
+    _written = time.monotonic()
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = _path(os.getpid())
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state(), f)
+    os.replace(path + '.tmp', path)
+
+
+def _maybe_write():
+    if METRICS_DIR and time.monotonic() - _written >= WRITE_INTERVAL:
+        try:
+            write()
+        except OSError:
+            pass
+
+
+def merged():
+    states = [state()]
+    if METRICS_DIR and os.path.isdir(METRICS_DIR):
+        for name in os.listdir(METRICS_DIR):
+            if name.endswith('.json') and name != '{}.json'.format(os.getpid()):
+                try:
+                    with open(os.path.join(METRICS_DIR, name)) as f:
+                        states.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+
+    counters, histograms = {}, {}
+    for s in states:
+        for metric, labels, value in s['counters']:
+            key = (metric, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for metric, labels, counts in s['histograms']:
+            key = (metric, tuple(map(tuple, labels)))
+            total = histograms.setdefault(key, [0] * len(counts))
+            histograms[key] = [a + b for a, b in zip(total, counts)]
+    return counters, histograms
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, _escape(v)) for k, v in pairs) + '}'
+
+
+def render():
+    # the prometheus text exposition format
+    counters, histograms = merged()
+    lines = []
+    for metric, (kind, description, buckets) in METRICS.items():
+        lines += ['# HELP {} {}'.format(metric, description), '# TYPE {} {}'.format(metric, kind)]
+        if kind == 'counter':
+            for (name, labels), value in sorted(counters.items()):
+                if name == metric:
+                    lines.append('{}{} {}'.format(metric, _labels(labels), value))
+            continue
+        for (name, labels), counts in sorted(histograms.items()):
+            if name != metric:
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], counts):
+                cumulative += count
+                lines.append('{}_bucket{} {}'.format(metric, _labels(labels, [('le', bound)]), cumulative))
+            lines.append('{}_sum{} {}'.format(metric, _labels(labels), counts[-2]))
+            lines.append('{}_count{} {}'.format(metric, _labels(labels), counts[-1]))
+    return '\n'.join(lines) + '\n'
+
+
+def callback_name(app, output):
+    # the page and function a callback request is for: pages.qb's qb_update_graph is ('qb', 'qb_update_graph'), and
+    # callbacks dash registers itself are under 'dash'
+    func = app.callback_map.get(output, {}).get('callback')
+    if func is None:
+        return 'unknown', 'unknown'
+    module = getattr(func, '__module__', '') or ''
+    page = module.split('.', 1)[1] if module.startswith('pages.') else 'dash' if module.startswith('dash') else module
+    return page, getattr(func, '__name__', 'unknown')
+
+
+def init(app):
+    # time every callback request and expose everything recorded at /metrics
+    server = app.server
+    update_path = app.config.routes_pathname_prefix + '_dash-update-component'
+
+    @server.before_request
+    def start_timer():
+        if request.path == update_path:
+            g.metrics_started = time.perf_counter()
+
+    @server.after_request
+    def record(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            body = request.get_json(silent=True) or {}
+            page, name = callback_name(app, body.get('output'))
+            labels = {'page': page, 'callback': name}
+            inc('ff_callback_requests_total', dict(labels, status=str(response.status_code)))
+            observe('ff_callback_duration_seconds', labels, time.perf_counter() - started)
+            if not response.is_streamed:
+                observe('ff_callback_response_bytes', labels, response.calculate_content_length() or 0)
+        return response
+
+    @server.route('/metrics')
+    def metrics():
+        return Response(render(), mimetype='text/plain; version=0.0.4')
+
+    if METRICS_DIR:
+        atexit.register(write)
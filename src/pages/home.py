@@ -1,5 +1,6 @@
 import dash
-from dash import Dash, html, dcc, dash_table, callback, Output, Input
+from dash import Dash, html, dcc, dash_table, callback, clientside_callback, ClientsideFunction, ctx, no_update, Output, Input, State
+from dash.exceptions import PreventUpdate
 import plotly.express as px
 import pandas as pd
 from dash.dash_table import DataTable
@@ -7,274 +8,303 @@ from dash.dash_table.Format import Format, Scheme, Trim
 import plotly.graph_objects as go
 import numpy as np
 
-import nfl_data_py as nfl
 import dash_bootstrap_components as dbc
 
-# bring in nfl play data for the previous seasons
-pbp_rp = nfl.import_seasonal_data([2019,2020,2021,2022,2023])
+import cache
+import datastore
+import figures
+import search
 
-# filter down to use only needed stats
-player_stats = pbp_rp.filter(items=['player_id', 'season', 'games', 'completions', 'attempts',
-                                    'passing_yards', 'passing_tds', 'interceptions', 'sacks','carries', 'rushing_yards',
-                                    'rushing_tds','receptions', 'targets', 'receiving_yards', 'receiving_tds', 'receiving_yards_after_catch',
-                                    'fantasy_points', 'fantasy_points_ppr'])
+def load(snapshot):
+    # load the season stats and the unpivoted graph data from the local snapshot built by ingest.py
+    frames = snapshot.frames('home')
+    return {
+        'frames': frames,
+        # season totals split by (position, season) for the scatter plot
+        'season_store': datastore.season_store(frames['player_stats']),
+        # row positions of each player, for the time series
+        'dfr_players': datastore.PlayerIndex(frames['dfr'], 'display_name'),
+        # each player's stats table rows, built once
+        'stats_records': datastore.player_records(figures.rounded(frames['player_stats']), 'display_name'),
+        # every player's name, for the search in the player dropdown
+        'player_search': search.player_index(frames['player_stats']['display_name'], frames['player_stats'],
+                                             'display_name'),
+        'stats_columns': [{'id': c, 'name': c} for c in frames['player_stats'].columns],
+    }
 
-# grab player information to link position and display name to the season stats, then filter that data down
-player_index = nfl.import_players()
-player_index = player_index.filter(items=['display_name', 'position', 'gsis_id'])
 
-player_index.rename(columns={'gsis_id':'player_id'}, inplace=True)
+# loaded on the first visit to the page, or in the background by datastore.warm_up, and rebuilt by datastore.swap
+home_data = datastore.Lazy('home', load)
 
-# join the season stats data and the player info data
-player_stats = player_stats.merge(player_index, how='left', on='player_id')
-player_stats['yards_per_attempt'] = player_stats['rushing_yards'] / player_stats['carries']
-player_stats['fp_per_game'] = player_stats['fantasy_points'] / player_stats['games']
-player_stats['fp_ppr_per_game'] = player_stats['fantasy_points_ppr'] / player_stats['games']
 
-# filter out for minium receptions
-player_stats = player_stats[(player_stats['attempts'] >= 100) | (player_stats['carries'] >= 50) | (player_stats['receptions']>= 10)]
-
-player_stats = player_stats.filter(items=['display_name', 'position', 'season', 'games', 'completions', 'attempts',
-                                        'passing_yards', 'passing_tds', 'interceptions', 'sacks', 'carries', 'rushing_yards', 'rushing_tds', 'yards_per_attempt',
-                                          'receptions', 'targets', 'receiving_yards', 'receiving_tds',
-                                          'receiving_yards_after_catch', 'fantasy_points', 'fp_per_game', 'fantasy_points_ppr', 'fp_ppr_per_game'])
-
-player_stats = player_stats.sort_values(['display_name', 'season'])
-
-# delete the previous dataframes to keep memory down
-del player_index
-del pbp_rp
-
-# unpivot the data in order to render graph axis with selected categories
-dfr = player_stats.melt(id_vars=['season', 'display_name', 'position'],
-                                 var_name='Category',
-                                 value_vars=['games', 'completions', 'attempts',
-                                    'passing_yards', 'passing_tds', 'interceptions', 'sacks','carries', 'rushing_yards', 'rushing_tds', 'yards_per_attempt',
-       'receptions', 'targets', 'receiving_yards', 'receiving_tds',
-       'receiving_yards_after_catch', 'fantasy_points', 'fantasy_points_ppr'])
+def create_time_series(dff, title):
+ 
+    fig = px.scatter(dff, x='season', y='value')
+ 
+    fig.update_traces(mode='lines+markers')
+ 
+    fig.update_xaxes(showgrid=False)
+ 
+    fig.add_annotation(x=0, y=0.85, xanchor='left', yanchor='bottom',
+                       xref='paper', yref='paper', showarrow=False, align='left',
+                       text=title)
+ 
+    fig.update_layout(height=225, margin={'l': 20, 'b': 30, 'r': 10, 't': 10})
+ 
+    return fig
  
 dash.register_page(__name__, path='/', order=0)
 # app = Dash(__name__)
 # server = app.server
 
-layout = dbc.Container([html.H1("Fantasy Football POC"), html.P("Proof of concept to visualize player stats dynamically"),
-                    html.H2("Skill Players' Stats"),
-                    html.Div([
-                        dcc.Dropdown(
-                            ['QB', 'RB', 'WR', 'TE'],
-                            'RB',
-                            id='crossfilter-player-position'
-                            ), html.P("Player Position Category")
-                        ]), 
-                    html.Br(), 
-                    html.Div([
-                        dcc.Dropdown(
-                            dfr['Category'].unique(),
-                            'games',
-                            id='crossfilter-xaxis-column'
-                        ), html.P("x-axis category")
-                            ],
-                            style={'width': '32%', 'display': 'inline-block'}),
-                    html.Div([
-                        dcc.Dropdown(
-                            dfr['Category'].unique(),
-                            'fantasy_points',
-                            id='crossfilter-yaxis-column'
-                        ), html.P("y-axis category")
-                            ],
-                            style={'width': '32%', 'display': 'inline-block'}),
-                    html.Div([
-                        dcc.Dropdown(
-                            dfr['Category'].unique(),
-                            'fantasy_points_ppr',
-                            id='crossfilter-zaxis-column'
-                        ), html.P("z-axis category")
-                            ],
-                            style={'width': '32%', 'display': 'inline-block'}),
-                    html.Div(dcc.Graph(
-                          id='crossfilter-indicator-scatter',
-                          hoverData={'points':[{'customdata': 'Derrick Henry'}]}
-                            ),
-                            style={'width': '49%', 'height':'100%', 'display': 'inline-block', 'padding': '0 20'}),
-                    html.Div([dcc.Graph(id='x-time-series'),
-                            dcc.Graph(id='y-time-series'),
-                            dcc.Graph(id='z-time-series')],
-                            style={'display': 'inline-block', 'width': '49%'})
-                    ,
-                    html.Br(),
-                    html.Div([html.P("Season"),
-                            dcc.Slider(
-                                    dfr['season'].min(),
-                                    dfr['season'].max(),
-                                    step=1,
-                                    id='crossfilter-year-slider',
-                                    value=dfr['season'].max(),
-                                    marks={str(year): str(year) for year in dfr['season'].unique()}
-                                )], style={'width': '49%', 'padding': '0px 20px 20px 20px'}
-                            ),
-                    html.Br(),
-                    html.Div([
-                        dcc.Dropdown(
-                            player_stats['display_name'].unique(),
-                                'Derrick Henry',
-                                id='select-player-list'
-                                )
-                            ],
-                            style={'width': '32%', 'display': 'inline-block'}),
-                    html.Br(),
-                    html.Div(id='display-player-stats'),
-                    html.Br(),
-                    html.Footer("**Github.com - NFLVerse")
-                ]
-            )
+
+def page_layout():
+    frames = home_data.get()['frames']
+    dfr = frames['dfr']
+
+    return dbc.Container([html.H1("Fantasy Football POC"), html.P("Proof of concept to visualize player stats dynamically"),
+                        html.H2("Skill Players' Stats"),
+                        html.Div([
+                            dcc.Dropdown(
+                                ['QB', 'RB', 'WR', 'TE'],
+                                'RB',
+                                id='crossfilter-player-position'
+                                ), html.P("Player Position Category")
+                            ]), 
+                        html.Br(), 
+                        html.Div([
+                            dcc.Dropdown(
+                                dfr['Category'].unique(),
+                                'games',
+                                id='crossfilter-xaxis-column',
+                                clearable=False
+                            ), html.P("x-axis category")
+                                ],
+                                style={'width': '32%', 'display': 'inline-block'}),
+                        html.Div([
+                            dcc.Dropdown(
+                                dfr['Category'].unique(),
+                                'fantasy_points',
+                                id='crossfilter-yaxis-column',
+                                clearable=False
+                            ), html.P("y-axis category")
+                                ],
+                                style={'width': '32%', 'display': 'inline-block'}),
+                        html.Div([
+                            dcc.Dropdown(
+                                dfr['Category'].unique(),
+                                'fantasy_points_ppr',
+                                id='crossfilter-zaxis-column',
+                                clearable=False
+                            ), html.P("z-axis category")
+                                ],
+                                style={'width': '32%', 'display': 'inline-block'}),
+                        html.Div(dcc.Graph(
+                              id='crossfilter-indicator-scatter',
+                              hoverData={'points':[{'customdata': 'Derrick Henry'}]}
+                                ),
+                                style={'width': '49%', 'height':'100%', 'display': 'inline-block', 'padding': '0 20'}),
+                        html.Div([dcc.Graph(id='x-time-series'),
+                                dcc.Graph(id='y-time-series'),
+                                dcc.Graph(id='z-time-series'),
+                                dcc.Store(id='player-series'),
+                                dcc.Store(id='scatter-version'),
+                                dcc.Store(id='time-series-layout', data=figures.time_series_layout(create_time_series, 'season'))],
+                                style={'display': 'inline-block', 'width': '49%'})
+                        ,
+                        html.Br(),
+                        html.Div([html.P("Season"),
+                                dcc.Slider(
+                                        dfr['season'].min(),
+                                        dfr['season'].max(),
+                                        step=1,
+                                        id='crossfilter-year-slider',
+                                        value=dfr['season'].max(),
+                                        marks={str(year): str(year) for year in dfr['season'].unique()}
+                                    )], style={'width': '49%', 'padding': '0px 20px 20px 20px'}
+                                ),
+                        html.Br(),
+                        html.Div([
+                            dcc.Dropdown(
+                                    ['Derrick Henry'],
+                                    'Derrick Henry',
+                                    id='select-player-list',
+                                    placeholder='Search for a player',
+                                    search_order='original'
+                                    )
+                                ],
+                                style={'width': '32%', 'display': 'inline-block'}),
+                        html.Br(),
+                        html.Div(id='display-player-stats'),
+                        html.Br(),
+                        html.Footer("**Github.com - NFLVerse")
+                    ]
+                )
+
+
+def layout(**kwargs):
+    # the page is registered as soon as the app imports it, but its data loads on the first visit (or from the warm up
+    # thread). until it is ready the page shows a spinner and polls for it
+    if home_data.ready():
+        return html.Div(page_layout(), id='page')
+    home_data.start()
+    return html.Div([dbc.Spinner(html.P('Loading player stats...')),
+                     dcc.Interval(id='page-poll', interval=1000)],
+                    id='page')
+
+
+@callback(
+    Output('page', 'children'),
+    Input('page-poll', 'n_intervals'),
+    prevent_initial_call=True)
+def show_page(n_intervals):
+    if not home_data.ready():
+        raise PreventUpdate
+    return page_layout()
           
  
 
 # callbacks are used to update the graphs and datatable, based on the user's selection
 @callback(
     Output('crossfilter-indicator-scatter', 'figure'),
+    Output('scatter-version', 'data'),
     Input('crossfilter-xaxis-column', 'value'),
     Input('crossfilter-yaxis-column', 'value'),
     Input('crossfilter-zaxis-column', 'value'),
     Input('crossfilter-year-slider', 'value'),
-    Input('crossfilter-player-position', 'value'))
+    Input('crossfilter-player-position', 'value'),
+    State('scatter-version', 'data'))
 def update_graph(xaxis_column_name, yaxis_column_name,zaxis_column_name,
-                 year_value, player_position):
+                 year_value, player_position, figure_version):
+    # an axis change only patches that axis in the figure the browser already has; a new season or position changes
+    # the players, so it gets the whole figure. so does a figure drawn from another snapshot than the one served here
+    # (a refresh reorders the players of the current season), which the version stored with every whole figure
+    # tells. the version is read before the data, so a swap in between only costs a whole figure
+    version = datastore.version
+    axis = {'crossfilter-xaxis-column': ('x', xaxis_column_name),
+            'crossfilter-yaxis-column': ('y', yaxis_column_name),
+            'crossfilter-zaxis-column': ('z', zaxis_column_name)}.get(ctx.triggered_id)
+    if axis is not None and figure_version == version:
+        data = home_data.get()
+        dff = data['season_store'].get((player_position, year_value), data['frames']['player_stats'].iloc[:0])
+        return figures.scatter_axis_patch(axis[0], dff[axis[1]].to_numpy(), axis[1]), no_update
+    return scatter_figure(xaxis_column_name, yaxis_column_name, zaxis_column_name, year_value,
+                          player_position), version
+
+
+@cache.memoize('home.scatter_figure')
+def scatter_figure(xaxis_column_name, yaxis_column_name, zaxis_column_name, year_value, player_position):
     
-    dff = dfr[dfr['season'] == year_value] 
-    dff = dff[dff['position']== player_position]
+    data = home_data.get()
+    dff = data['season_store'].get((player_position, year_value), data['frames']['player_stats'].iloc[:0])
                         
-    fig = px.scatter_3d(x=dff[dff['Category'] == xaxis_column_name]['value'],
-            y=dff[dff['Category'] == yaxis_column_name]['value'],
-            z=dff[dff['Category'] == zaxis_column_name]['value'],
-            hover_name=dff[dff['Category'] == yaxis_column_name]['display_name']
+    fig = px.scatter_3d(x=dff[xaxis_column_name].to_numpy(),
+            y=dff[yaxis_column_name].to_numpy(),
+            z=dff[zaxis_column_name].to_numpy(),
+            hover_name=dff['display_name']
             )
     
     fig.update_scenes(xaxis_title=xaxis_column_name,
                       yaxis_title=yaxis_column_name,
                       zaxis_title=zaxis_column_name) 
     
-    fig.update_traces(customdata=dff[dff['Category'] == yaxis_column_name]['display_name'], marker_size=5)
+    fig.update_traces(customdata=dff['display_name'], marker_size=5)
 
  
     fig.update_layout(height = 675, margin={'l': 40, 'b': 40, 't': 10, 'r': 0}, hovermode='closest', showlegend=False)
     fig.update_layout(showlegend = False)
  
-    return fig
- 
- 
-def create_time_series(dff, title):
- 
-    fig = px.scatter(dff, x='season', y='value')
- 
-    fig.update_traces(mode='lines+markers')
- 
-    fig.update_xaxes(showgrid=False)
- 
-    fig.add_annotation(x=0, y=0.85, xanchor='left', yanchor='bottom',
-                       xref='paper', yref='paper', showarrow=False, align='left',
-                       text=title)
- 
-    fig.update_layout(height=225, margin={'l': 20, 'b': 30, 'r': 10, 't': 10})
- 
-    return fig
- 
- 
-@callback(
-    Output('x-time-series', 'figure', allow_duplicate=True),
-    Input('crossfilter-indicator-scatter', 'hoverData'),
-    Input('crossfilter-xaxis-column', 'value'),
-    prevent_initial_call=True)
-def update_x_timeseries_from_plot(hoverData, xaxis_column_name):
-    player_name = hoverData['points'][0]['customdata']
-    dff = dfr[dfr['display_name'] == player_name]
-    dff = dff[dff['Category'] == xaxis_column_name]
-    title = '<b>{}</b><br>{}'.format(player_name, xaxis_column_name)
-    return create_time_series(dff, title)
-
- 
-@callback(
-    Output('y-time-series', 'figure', allow_duplicate=True),
-    Input('crossfilter-indicator-scatter', 'hoverData'),
-    Input('crossfilter-yaxis-column', 'value'),
-    prevent_initial_call=True)
-def update_y_timeseries_from_plot(hoverData, yaxis_column_name):
-    dff = dfr[dfr['display_name'] == hoverData['points'][0]['customdata']]
-    dff = dff[dff['Category'] == yaxis_column_name]
-    return create_time_series(dff, yaxis_column_name)
+    return figures.compact(fig)
 
-@callback(
-    Output('z-time-series', 'figure', allow_duplicate=True),
-    Input('crossfilter-indicator-scatter', 'hoverData'),
-    Input('crossfilter-zaxis-column', 'value'),
-    prevent_initial_call=True)
-def update_z_timeseries_from_plot(hoverData, zaxis_column_name):
-    dff = dfr[dfr['display_name'] == hoverData['points'][0]['customdata']]
-    dff = dff[dff['Category'] == zaxis_column_name]
-    return create_time_series(dff, zaxis_column_name)
 
-@callback(
-    Output('display-player-stats', 'children', allow_duplicate=True),
-    Output('select-player-list', 'value', allow_duplicate=True),
-    Input('crossfilter-indicator-scatter', 'hoverData'),
-    prevent_initial_call = True
- )
-def show_player_stats_from_plot(hoverData):
-    player_name = hoverData['points'][0]['customdata']
-    dfs = player_stats[player_stats['display_name'] == player_name]
+# the figure only depends on the player and the category, so repeat hovers are served from the cache
+@cache.memoize('home.time_series')
+def player_time_series(player_name, column_name, title):
+    dff = home_data.get()['dfr_players'].rows(player_name)
+    dff = dff[dff['Category'] == column_name]
+    return figures.compact(create_time_series(dff, title))
 
-    dfs = dfs.sort_values('season')
 
-    return dash_table.DataTable(data=dfs.to_dict('records'),
-                columns=[{'id': c, 'name': c} for c in dfs.columns],
+# the current player's stats as a compact payload for drawing the time series in the browser
+@cache.memoize('home.player_series')
+def player_series(player_name):
+    return figures.series_payload(player_name, home_data.get()['dfr_players'].rows(player_name), 'season')
+ 
+ 
+def player_stats_table(player_name):
+    data = home_data.get()
+    return dash_table.DataTable(data=data['stats_records'].get(player_name, []),
+                columns=data['stats_columns'],
                 fixed_rows={'headers':True},
                 fixed_columns={'headers':True,'data':2},
                 style_table={'overlowX':'auto', 'minWidth':'100%'},
-                style_cell={'minWidth':'150px'}), player_name
-                
+                style_cell={'minWidth':'150px'}
+                )
+
+# one callback resolves the current player and sends their stats table and time series data. a hover on the
+# scatter makes the hovered player current and moves the dropdown to it (its only option until the next search),
+# which doesn't fire this callback again
 @callback(
+    Output('player-series', 'data'),
     Output('display-player-stats', 'children'),
-    Input('select-player-list', 'value')
- )
-def show_player_stats(player_name):
-    df = player_stats[player_stats['display_name'] == player_name]
+    Output('select-player-list', 'value'),
+    Output('select-player-list', 'options'),
+    Input('crossfilter-indicator-scatter', 'hoverData'),
+    Input('select-player-list', 'value'))
+def update_player(hoverData, player_name):
+    if ctx.triggered_id != 'crossfilter-indicator-scatter':
+        return player_series(player_name), player_stats_table(player_name), no_update, no_update
 
-    df = df.sort_values('season')
+    if hoverData['points'][0]['customdata'] == player_name:
+        # still over the current player, so there is nothing to redraw
+        raise PreventUpdate
+    player_name = hoverData['points'][0]['customdata']
+    return player_series(player_name), player_stats_table(player_name), player_name, [player_name]
 
-    return dash_table.DataTable(data=df.to_dict('records'),
-                columns=[{'id': c, 'name': c} for c in df.columns],
-                fixed_rows={'headers':True},
-                fixed_columns={'headers':True,'data':2},
-                style_table={'overlowX':'auto', 'minWidth':'100%'},
-                style_cell={'minWidth':'150px'}
-                )
 
+# the dropdown only holds the current player until something is typed into it, then the best matching names from
+# the server
 @callback(
-    Output('x-time-series', 'figure'),
-    Input('select-player-list', 'value'),
-    Input('crossfilter-xaxis-column', 'value'))
-def update_x_timeseries(hoverData, xaxis_column_name):
-    player_name = hoverData
-    dff = dfr[dfr['display_name'] == player_name]
-    dff = dff[dff['Category'] == xaxis_column_name]
-    title = '<b>{}</b><br>{}'.format(player_name, xaxis_column_name)
-    return create_time_series(dff, title)
+    Output('select-player-list', 'options', allow_duplicate=True),
+    Input('select-player-list', 'search_value'),
+    State('select-player-list', 'value'),
+    prevent_initial_call=True)
+def search_players(search_value, player_name):
+    if not search_value:
+        raise PreventUpdate
+    return search.options(home_data.get()['player_search'].search(search_value), player_name, search_value)
 
- 
-@callback(
-    Output('y-time-series', 'figure'),
-    Input('select-player-list', 'value'),
-    Input('crossfilter-yaxis-column', 'value'))
-def update_y_timeseries(hoverData, yaxis_column_name):
-    dff = dfr[dfr['display_name'] == hoverData]
-    dff = dff[dff['Category'] == yaxis_column_name]
-    return create_time_series(dff, yaxis_column_name)
 
-@callback(
+def update_time_series(series, xaxis_column_name, yaxis_column_name, zaxis_column_name, base):
+    # the server side version of timeseries.draw; a new player redraws everything, an axis change only redraws its
+    # own time series
+    if not series:
+        raise PreventUpdate
+    player_name = series['player']
+    trigger = ctx.triggered_id
+    player_changed = trigger not in ('crossfilter-xaxis-column', 'crossfilter-yaxis-column', 'crossfilter-zaxis-column')
+    x_figure = y_figure = z_figure = no_update
+    if player_changed or trigger == 'crossfilter-xaxis-column':
+        title = '<b>{}</b><br>{}'.format(player_name, xaxis_column_name)
+        x_figure = player_time_series(player_name, xaxis_column_name, title)
+    if player_changed or trigger == 'crossfilter-yaxis-column':
+        y_figure = player_time_series(player_name, yaxis_column_name, yaxis_column_name)
+    if player_changed or trigger == 'crossfilter-zaxis-column':
+        z_figure = player_time_series(player_name, zaxis_column_name, zaxis_column_name)
+    return x_figure, y_figure, z_figure
+
+
+time_series_io = (
+    Output('x-time-series', 'figure'),
+    Output('y-time-series', 'figure'),
     Output('z-time-series', 'figure'),
-    Input('select-player-list', 'value'),
-    Input('crossfilter-zaxis-column', 'value'))
-def update_z_timeseries(hoverData, zaxis_column_name):
-    dff = dfr[dfr['display_name'] == hoverData]
-    dff = dff[dff['Category'] == zaxis_column_name]
-    return create_time_series(dff, zaxis_column_name)
+    Input('player-series', 'data'),
+    Input('crossfilter-xaxis-column', 'value'),
+    Input('crossfilter-yaxis-column', 'value'),
+    Input('crossfilter-zaxis-column', 'value'),
+    State('time-series-layout', 'data'))
+
+if figures.CLIENTSIDE_TIMESERIES:
+    clientside_callback(ClientsideFunction('timeseries', 'draw'), *time_series_io)
+else:
+    callback(*time_series_io)(update_time_series)
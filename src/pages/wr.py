@@ -1,5 +1,6 @@
 import dash
-from dash import Dash, html, dcc, dash_table, callback, Output, Input
+from dash import Dash, html, dcc, dash_table, callback, clientside_callback, ClientsideFunction, ctx, no_update, Output, Input, State
+from dash.exceptions import PreventUpdate
 import plotly.express as px
 import pandas as pd
 from dash.dash_table import DataTable
@@ -7,127 +8,173 @@ from dash.dash_table.Format import Format, Scheme, Trim
 import plotly.graph_objects as go
 import numpy as np
 
-import nfl_data_py as nfl
 import dash_bootstrap_components as dbc
 
-# bring in nfl play data for the previous seasons
-player_stats = nfl.import_weekly_data(years=[2019,2020,2021,2022,2023], columns=['player_display_name', 'position', 'season_type', 'season', 'week', 'recent_team', 'opponent_team'
-                                                                           ,'carries', 'rushing_yards',
+import analytics
+import cache
+import datastore
+import figures
+import jobs
+import leaderboard
+import search
+
+column_order = ['season', 'player_display_name','games', 'carries', 'rushing_yards',
                                                                             'rushing_tds', 'rushing_fumbles', 'rushing_first_downs', 
                                                                             'receptions', 'targets', 'receiving_yards', 'receiving_tds', 'receiving_air_yards',
-                                                                            'receiving_yards_after_catch', 'receiving_first_downs',
-                                                                           'fantasy_points', 'fantasy_points_ppr'],
-                                                                           downcast=True)
-
-player_stats = player_stats.loc[(player_stats['position'] == 'WR') & (player_stats['season_type'] == 'REG')]
-
-# join the season stats data and the player info data
-player_stats['new_week'] = player_stats['week'].astype(str)
-player_stats['new_week'] = np.where(player_stats['new_week'].str.len()==1, '0' + player_stats['new_week'], player_stats['new_week'])
-player_stats['games'] = 1
-player_stats['season_sort_order'] = player_stats['season'].astype(str) + '.' + player_stats['new_week'].astype(str)
-
+                                                                            'receiving_yards_after_catch', 'receiving_first_downs','fantasy_points', 'fantasy_points_ppr']
 
-player_stats = player_stats.sort_values(['player_display_name', 'season_sort_order'])
+stats_columns = [{'id': c, 'name': c} for c in column_order]
 
-# delete the previous dataframes to keep memory down
 
-dfr = player_stats.pivot_table(index=['player_display_name', 'position', 'season', 'season_type'], values=['games', 'carries', 'rushing_yards',
-                                                                            'rushing_tds', 'rushing_fumbles', 'rushing_first_downs', 
-                                                                            'receptions', 'targets', 'receiving_yards', 'receiving_tds', 'receiving_air_yards',
-                                                                            'receiving_yards_after_catch', 'receiving_first_downs', 'fantasy_points', 'fantasy_points_ppr'],
-                               aggfunc='sum')
+def wr_load(snapshot):
+    # the weekly and season stats for every position are loaded once and shared by the position pages
+    frames = datastore.position_frames('WR', snapshot)
+    return {
+        'frames': frames,
+        # season totals split by season for the scatter plot
+        'season_store': datastore.season_store(frames['season']),
+        # row positions of each player, for the time series
+        'weekly_players': datastore.PlayerIndex(frames['player_stats'], 'player_display_name'),
+        # each player's stats table rows, built once
+        'stats_records': datastore.player_records(figures.rounded(frames['season']), 'player_display_name',
+                                                  column_order),
+        # every player's name, for the search in the player dropdown
+        'player_search': search.player_index(frames['player_stats']['player_display_name'], frames['season'],
+                                             'player_display_name'),
+        # every player season, sorted, filtered and paged on the server for the leaderboard
+        'leaderboard': leaderboard.Leaderboard(figures.rounded(frames['season']), column_order),
+    }
 
-dfr = dfr.dropna()
-dfr.reset_index(inplace=True)
 
-dfr = dfr[dfr['receptions'] >= 20]
-# unpivot the data in order to render graph axis with selected categories
-dfr = dfr.melt(id_vars=['season', 'player_display_name', 'position'],
-                                 var_name='Category',
-                                 value_vars=['games', 'carries', 'rushing_yards',
-                                                                            'rushing_tds', 'rushing_fumbles', 'rushing_first_downs', 
-                                                                            'receptions', 'targets', 'receiving_yards', 'receiving_tds', 'receiving_air_yards',
-                                                                            'receiving_yards_after_catch', 'receiving_first_downs','fantasy_points', 'fantasy_points_ppr'])
+# loaded on the first visit to the page, or in the background by datastore.warm_up, and rebuilt by datastore.swap
+wr_data = datastore.Lazy('wr', wr_load)
 
-player_stats = player_stats.melt(id_vars=['season', 'week', 'player_display_name', 'position', 'recent_team', 'opponent_team', 'season_sort_order'],
-                                 var_name='Category',
-                                 value_vars=['carries', 'rushing_yards',
-                                                                            'rushing_tds', 'rushing_fumbles', 'rushing_first_downs', 
-                                                                            'receptions', 'targets', 'receiving_yards', 'receiving_tds', 'receiving_air_yards',
-                                                                            'receiving_yards_after_catch', 'receiving_first_downs','fantasy_points', 'fantasy_points_ppr'])
 
-column_order = ['season', 'player_display_name','games', 'carries', 'rushing_yards',
-                                                                            'rushing_tds', 'rushing_fumbles', 'rushing_first_downs', 
-                                                                            'receptions', 'targets', 'receiving_yards', 'receiving_tds', 'receiving_air_yards',
-                                                                            'receiving_yards_after_catch', 'receiving_first_downs','fantasy_points', 'fantasy_points_ppr']
+def wr_create_time_series(dff, title):
+ 
+    fig = px.line(dff, x='week', y='value', color='season')
+ 
+    fig.update_traces(mode='lines+markers')
+ 
+    fig.update_xaxes(showgrid=False)
+ 
+    fig.add_annotation(x=0, y=0.85, xanchor='left', yanchor='bottom',
+                       xref='paper', yref='paper', showarrow=False, align='left',
+                       text=title)
+ 
+    fig.update_layout(height=225, margin={'l': 20, 'b': 30, 'r': 10, 't': 10})
+ 
+    return fig
  
 dash.register_page(__name__, name = 'Wide Receivers', order = 3)
 # app = Dash(__name__)
 # server = app.server
 
-layout = dbc.Container([html.H1("Fantasy Football POC"), html.P("Proof of concept to visualize player stats dynamically"),
-                    html.H2("Skill Players' Stats"), 
-                    html.Div([
-                        dcc.Dropdown(
-                            dfr['Category'].unique(),
-                            'receptions',
-                            id='wr-crossfilter-xaxis-column'
-                        ), html.P("x-axis category")
-                            ],
-                            style={'width': '32%', 'display': 'inline-block'}),
-                    html.Div([
-                        dcc.Dropdown(
-                            dfr['Category'].unique(),
-                            'receiving_tds',
-                            id='wr-crossfilter-yaxis-column'
-                        ), html.P("y-axis category")
-                            ],
-                            style={'width': '32%', 'display': 'inline-block'}),
-                    html.Div([
-                        dcc.Dropdown(
-                            dfr['Category'].unique(),
-                            'fantasy_points_ppr',
-                            id='wr-crossfilter-zaxis-column'
-                        ), html.P("z-axis category")
-                            ],
-                            style={'width': '32%', 'display': 'inline-block'}),
-                    html.Div(dcc.Graph(
-                          id='wr-crossfilter-indicator-scatter',
-                          hoverData={'points':[{'customdata': 'Justin Jefferson'}]}
-                            ),
-                            style={'width': '49%', 'height':'100%', 'display': 'inline-block', 'padding': '0 20'}),
-                    html.Div([dcc.Graph(id='wr-x-time-series'),
-                            dcc.Graph(id='wr-y-time-series'),
-                            dcc.Graph(id='wr-z-time-series')],
-                            style={'display': 'inline-block', 'width': '49%'})
-                    ,
-                    html.Br(),
-                    html.Div([html.P("Season"),
-                            dcc.Slider(
-                                    dfr['season'].min(),
-                                    dfr['season'].max(),
-                                    step=1,
-                                    id='wr-crossfilter-year-slider',
-                                    value=dfr['season'].max(),
-                                    marks={str(year): str(year) for year in dfr['season'].unique()}
-                                )], style={'width': '49%', 'padding': '0px 20px 20px 20px'}
-                            ),
-                    html.Br(),
-                    html.Div([
-                        dcc.Dropdown(
-                            player_stats['player_display_name'].unique(),
-                                'Justin Jefferson',
-                                id='wr-select-player-list'
-                                )
-                            ],
-                            style={'width': '32%', 'display': 'inline-block'}),
-                    html.Br(),
-                    html.Div(id='wr-display-player-stats'),
-                    html.Br(),
-                    html.Footer("**Github.com - NFLVerse")
-                ]
-            )
+
+def wr_page_layout():
+    frames = wr_data.get()['frames']
+    board = wr_data.get()['leaderboard']
+    dfr = frames['dfr']
+
+    return dbc.Container([html.H1("Fantasy Football POC"), html.P("Proof of concept to visualize player stats dynamically"),
+                        html.H2("Skill Players' Stats"), 
+                        html.Div([
+                            dcc.Dropdown(
+                                dfr['Category'].unique(),
+                                'receptions',
+                                id='wr-crossfilter-xaxis-column',
+                                clearable=False
+                            ), html.P("x-axis category")
+                                ],
+                                style={'width': '32%', 'display': 'inline-block'}),
+                        html.Div([
+                            dcc.Dropdown(
+                                dfr['Category'].unique(),
+                                'receiving_tds',
+                                id='wr-crossfilter-yaxis-column',
+                                clearable=False
+                            ), html.P("y-axis category")
+                                ],
+                                style={'width': '32%', 'display': 'inline-block'}),
+                        html.Div([
+                            dcc.Dropdown(
+                                dfr['Category'].unique(),
+                                'fantasy_points_ppr',
+                                id='wr-crossfilter-zaxis-column',
+                                clearable=False
+                            ), html.P("z-axis category")
+                                ],
+                                style={'width': '32%', 'display': 'inline-block'}),
+                        html.Div(dcc.Graph(
+                              id='wr-crossfilter-indicator-scatter',
+                              hoverData={'points':[{'customdata': 'Justin Jefferson'}]}
+                                ),
+                                style={'width': '49%', 'height':'100%', 'display': 'inline-block', 'padding': '0 20'}),
+                        html.Div([dcc.Graph(id='wr-x-time-series'),
+                                dcc.Graph(id='wr-y-time-series'),
+                                dcc.Graph(id='wr-z-time-series'),
+                                dcc.Store(id='wr-player-series'),
+                                dcc.Store(id='wr-scatter-version'),
+                                dcc.Store(id='wr-time-series-layout', data=figures.time_series_layout(wr_create_time_series, 'week', 'season'))],
+                                style={'display': 'inline-block', 'width': '49%'})
+                        ,
+                        html.Br(),
+                        html.Div([html.P("Season"),
+                                dcc.Slider(
+                                        dfr['season'].min(),
+                                        dfr['season'].max(),
+                                        step=1,
+                                        id='wr-crossfilter-year-slider',
+                                        value=dfr['season'].max(),
+                                        marks={str(year): str(year) for year in dfr['season'].unique()}
+                                    )], style={'width': '49%', 'padding': '0px 20px 20px 20px'}
+                                ),
+                        html.Br(),
+                        html.Div([
+                            dcc.Dropdown(
+                                    ['Justin Jefferson'],
+                                    'Justin Jefferson',
+                                    id='wr-select-player-list',
+                                    placeholder='Search for a player',
+                                    search_order='original'
+                                    )
+                                ],
+                                style={'width': '32%', 'display': 'inline-block'}),
+                        html.Br(),
+                        html.Div(id='wr-display-player-stats'),
+                        html.Br(),
+                        html.H2("Leaderboard"),
+                        leaderboard.table('wr-leaderboard', board.column_types(),
+                                          [{'column_id': 'fantasy_points_ppr', 'direction': 'desc'}]),
+                        html.Br(),
+                        *([html.H2("Season simulation"),
+                           analytics.controls('wr', dfr['season'].unique()),
+                           analytics.table('wr-simulation-table'),
+                           html.Br()] if analytics.SIMULATION else []),
+                        html.Footer("**Github.com - NFLVerse")
+                    ]
+                )
+
+
+def layout(**kwargs):
+    # the page is registered as soon as the app imports it, but its data loads on the first visit (or from the warm up
+    # thread). until it is ready the page shows a spinner and polls for it
+    if wr_data.ready():
+        return html.Div(wr_page_layout(), id='wr-page')
+    wr_data.start()
+    return html.Div([dbc.Spinner(html.P('Loading wide receiver stats...')),
+                     dcc.Interval(id='wr-page-poll', interval=1000)],
+                    id='wr-page')
+
+
+@callback(
+    Output('wr-page', 'children'),
+    Input('wr-page-poll', 'n_intervals'),
+    prevent_initial_call=True)
+def wr_show_page(n_intervals):
+    if not wr_data.ready():
+        raise PreventUpdate
+    return wr_page_layout()
           
  
 
@@ -135,121 +182,71 @@ layout = dbc.Container([html.H1("Fantasy Football POC"), html.P("Proof of concep
 # callbacks are used to update the graphs and datatable, based on the user's selection
 @callback(
     Output('wr-crossfilter-indicator-scatter', 'figure'),
+    Output('wr-scatter-version', 'data'),
     Input('wr-crossfilter-xaxis-column', 'value'),
     Input('wr-crossfilter-yaxis-column', 'value'),
     Input('wr-crossfilter-zaxis-column', 'value'),
-    Input('wr-crossfilter-year-slider', 'value'))
+    Input('wr-crossfilter-year-slider', 'value'),
+    State('wr-scatter-version', 'data'))
 def wr_update_graph(xaxis_column_name, yaxis_column_name,zaxis_column_name,
-                 year_value):
+                 year_value, figure_version):
+    # an axis change only patches that axis in the figure the browser already has; a new season changes
+    # the players, so it gets the whole figure. so does a figure drawn from another snapshot than the one served here
+    # (a refresh reorders the players of the current season), which the version stored with every whole figure
+    # tells. the version is read before the data, so a swap in between only costs a whole figure
+    version = datastore.version
+    axis = {'wr-crossfilter-xaxis-column': ('x', xaxis_column_name),
+            'wr-crossfilter-yaxis-column': ('y', yaxis_column_name),
+            'wr-crossfilter-zaxis-column': ('z', zaxis_column_name)}.get(ctx.triggered_id)
+    if axis is not None and figure_version == version:
+        data = wr_data.get()
+        dff = data['season_store'].get(('WR', year_value), data['frames']['season'].iloc[:0])
+        return figures.scatter_axis_patch(axis[0], dff[axis[1]].to_numpy(), axis[1]), no_update
+    return wr_scatter_figure(xaxis_column_name, yaxis_column_name, zaxis_column_name, year_value), version
+
+
+@cache.memoize('wr.scatter_figure')
+def wr_scatter_figure(xaxis_column_name, yaxis_column_name, zaxis_column_name, year_value):
     
-    dff = dfr[dfr['season'] == year_value] 
+    data = wr_data.get()
+    dff = data['season_store'].get(('WR', year_value), data['frames']['season'].iloc[:0])
                         
-    fig = px.scatter_3d(x=dff[dff['Category'] == xaxis_column_name]['value'],
-            y=dff[dff['Category'] == yaxis_column_name]['value'],
-            z=dff[dff['Category'] == zaxis_column_name]['value'],
-            hover_name=dff[dff['Category'] == yaxis_column_name]['player_display_name']
+    fig = px.scatter_3d(x=dff[xaxis_column_name].to_numpy(),
+            y=dff[yaxis_column_name].to_numpy(),
+            z=dff[zaxis_column_name].to_numpy(),
+            hover_name=dff['player_display_name']
             )
     
     fig.update_scenes(xaxis_title=xaxis_column_name,
                       yaxis_title=yaxis_column_name,
                       zaxis_title=zaxis_column_name) 
     
-    fig.update_traces(customdata=dff[dff['Category'] == yaxis_column_name]['player_display_name'], marker_size=5)
+    fig.update_traces(customdata=dff['player_display_name'], marker_size=5)
 
  
     fig.update_layout(height = 675, margin={'l': 40, 'b': 40, 't': 10, 'r': 0}, hovermode='closest', showlegend=False)
     fig.update_layout(showlegend = False)
  
-    return fig
- 
- 
-def wr_create_time_series(dff, title):
- 
-    fig = px.line(dff, x='week', y='value', color='season')
- 
-    fig.update_traces(mode='lines+markers')
- 
-    fig.update_xaxes(showgrid=False)
- 
-    fig.add_annotation(x=0, y=0.85, xanchor='left', yanchor='bottom',
-                       xref='paper', yref='paper', showarrow=False, align='left',
-                       text=title)
- 
-    fig.update_layout(height=225, margin={'l': 20, 'b': 30, 'r': 10, 't': 10})
- 
-    return fig
- 
- 
-@callback(
-    Output('wr-x-time-series', 'figure', allow_duplicate=True),
-    Input('wr-crossfilter-indicator-scatter', 'hoverData'),
-    Input('wr-crossfilter-xaxis-column', 'value'),
-    prevent_initial_call=True)
-def wr_update_x_timeseries_from_plot(hoverData, xaxis_column_name):
-    player_name = hoverData['points'][0]['customdata']
-    dff = player_stats[player_stats['player_display_name'] == player_name]
-    dff = dff[dff['Category'] == xaxis_column_name]
-    title = '<b>{}</b><br>{}'.format(player_name, xaxis_column_name)
-    return wr_create_time_series(dff, title)
+    return figures.compact(fig)
 
- 
-@callback(
-    Output('wr-y-time-series', 'figure', allow_duplicate=True),
-    Input('wr-crossfilter-indicator-scatter', 'hoverData'),
-    Input('wr-crossfilter-yaxis-column', 'value'),
-    prevent_initial_call=True)
-def wr_pdate_y_timeseries_from_plot(hoverData, yaxis_column_name):
-    dff = player_stats[player_stats['player_display_name'] == hoverData['points'][0]['customdata']]
-    dff = dff[dff['Category'] == yaxis_column_name]
-    return wr_create_time_series(dff, yaxis_column_name)
 
-@callback(
-    Output('wr-z-time-series', 'figure', allow_duplicate=True),
-    Input('wr-crossfilter-indicator-scatter', 'hoverData'),
-    Input('wr-crossfilter-zaxis-column', 'value'),
-    prevent_initial_call=True)
-def wr_update_z_timeseries_from_plot(hoverData, zaxis_column_name):
-    dff = player_stats[player_stats['player_display_name'] == hoverData['points'][0]['customdata']]
-    dff = dff[dff['Category'] == zaxis_column_name]
-    return wr_create_time_series(dff, zaxis_column_name)
+# the figure only depends on the player and the category, so repeat hovers are served from the cache
+@cache.memoize('wr.time_series')
+def wr_player_time_series(player_name, column_name, title):
+    dff = wr_data.get()['weekly_players'].rows(player_name)
+    dff = dff[dff['Category'] == column_name]
+    return figures.compact(wr_create_time_series(dff, title))
 
-@callback(
-    Output('wr-display-player-stats', 'children', allow_duplicate=True),
-    Output('wr-select-player-list', 'value', allow_duplicate=True),
-    Input('wr-crossfilter-indicator-scatter', 'hoverData'),
-    prevent_initial_call = True
- )
-def wr_show_player_stats_from_plot(hoverData):
-    player_name = hoverData['points'][0]['customdata']
-    dfs = dfr[dfr['player_display_name'] == player_name]
-    dfs = dfs.pivot(index=['season', 'player_display_name', 'position'], columns='Category')
-    dfs = dfs.sort_values('season')
-    dfs = dfs['value'].reset_index()
-    dfs = dfs[column_order]
-    return dash_table.DataTable(data=dfs.to_dict('records'),
-                columns=[{'id': c, 'name': c} for c in dfs.columns],
-                fixed_columns={'headers': True, 'data': 2},
-                style_table={'minWidth': '100%'},
-                style_cell={
-                    # all three widths are needed
-                    'minWidth': '180px', 'width': '180px', 'maxWidth': '180px',
-                    'overflow': 'hidden',
-                    'textOverflow': 'ellipsis',
-                }), player_name
-                
-@callback(
-    Output('wr-display-player-stats', 'children'),
-    Input('wr-select-player-list', 'value')
- )
-def wr_show_player_stats(player_name):
-    df = dfr[dfr['player_display_name'] == player_name]
-    df = df.pivot(index=['season', 'player_display_name', 'position'], columns='Category')
-    df = df.sort_values('season')
-    df = df['value'].reset_index()
-    df = df[column_order]
-
-    return dash_table.DataTable(data=df.to_dict('records'),
-                columns=[{'id': c, 'name': c} for c in df.columns],
+
+# the current player's stats as a compact payload for drawing the time series in the browser
+@cache.memoize('wr.player_series')
+def wr_player_series(player_name):
+    return figures.series_payload(player_name, wr_data.get()['weekly_players'].rows(player_name), 'week', 'season')
+ 
+ 
+def wr_player_stats_table(player_name):
+    return dash_table.DataTable(data=wr_data.get()['stats_records'].get(player_name, []),
+                columns=stats_columns,
                 fixed_columns={'headers': True, 'data': 2},
                 style_table={'minWidth': '100%'},
                 style_cell={
@@ -259,36 +256,111 @@ def wr_show_player_stats(player_name):
                     'textOverflow': 'ellipsis',
                 })
 
+# one callback resolves the current player and sends their stats table and time series data. a hover on the
+# scatter makes the hovered player current and moves the dropdown to it (its only option until the next search),
+# which doesn't fire this callback again
 @callback(
-    Output('wr-x-time-series', 'figure'),
-    Input('wr-select-player-list', 'value'),
-    Input('wr-crossfilter-xaxis-column', 'value'))
-def wr_update_x_timeseries(hoverData, xaxis_column_name):
-    player_name = hoverData
-    dff = player_stats[player_stats['player_display_name'] == player_name]
-    dff = dff[dff['Category'] == xaxis_column_name]
-    title = '<b>{}</b><br>{}'.format(player_name, xaxis_column_name)
-    return wr_create_time_series(dff, title)
+    Output('wr-player-series', 'data'),
+    Output('wr-display-player-stats', 'children'),
+    Output('wr-select-player-list', 'value'),
+    Output('wr-select-player-list', 'options'),
+    Input('wr-crossfilter-indicator-scatter', 'hoverData'),
+    Input('wr-select-player-list', 'value'))
+def wr_update_player(hoverData, player_name):
+    if ctx.triggered_id != 'wr-crossfilter-indicator-scatter':
+        return wr_player_series(player_name), wr_player_stats_table(player_name), no_update, no_update
 
- 
+    if hoverData['points'][0]['customdata'] == player_name:
+        # still over the current player, so there is nothing to redraw
+        raise PreventUpdate
+    player_name = hoverData['points'][0]['customdata']
+    return wr_player_series(player_name), wr_player_stats_table(player_name), player_name, [player_name]
+
+
+# the dropdown only holds the current player until something is typed into it, then the best matching names from
+# the server
 @callback(
-    Output('wr-y-time-series', 'figure'),
-    Input('wr-select-player-list', 'value'),
-    Input('wr-crossfilter-yaxis-column', 'value'))
-def update_y_timeseries(hoverData, yaxis_column_name):
-    dff = player_stats[player_stats['player_display_name'] == hoverData]
-    dff = dff[dff['Category'] == yaxis_column_name]
-    return wr_create_time_series(dff, yaxis_column_name)
+    Output('wr-select-player-list', 'options', allow_duplicate=True),
+    Input('wr-select-player-list', 'search_value'),
+    State('wr-select-player-list', 'value'),
+    prevent_initial_call=True)
+def wr_search_players(search_value, player_name):
+    if not search_value:
+        raise PreventUpdate
+    return search.options(wr_data.get()['player_search'].search(search_value), player_name, search_value)
 
+
+# the leaderboard for the season on the slider; only the rows of the page being shown are sent. a new season, sort
+# or filter goes back to the first page
 @callback(
+    Output('wr-leaderboard', 'data'),
+    Output('wr-leaderboard', 'page_count'),
+    Output('wr-leaderboard', 'page_current'),
+    Input('wr-crossfilter-year-slider', 'value'),
+    Input('wr-leaderboard', 'page_current'),
+    Input('wr-leaderboard', 'page_size'),
+    Input('wr-leaderboard', 'sort_by'),
+    Input('wr-leaderboard', 'filter_query'))
+def wr_update_leaderboard(year_value, page_current, page_size, sort_by, filter_query):
+    if ctx.triggered_prop_ids and 'wr-leaderboard.page_current' not in ctx.triggered_prop_ids:
+        page_current = 0
+    data, page_count = wr_data.get()['leaderboard'].page(year_value, page_current, page_size, sort_by, filter_query)
+    return data, page_count, page_current
+
+
+# a simulation of the page's best players' seasons, run as a background job (jobs.py) with a progress bar and a
+# cancel button. the button's click count is left out of the job cache key, so simulating the same seasons again on
+# the same data is answered from the cache
+if analytics.SIMULATION:
+    @jobs.background_callback(
+        Output('wr-simulation-table', 'data'),
+        Input('wr-simulation-run', 'n_clicks'),
+        State('wr-simulation-seasons', 'value'),
+        State('wr-simulation-runs', 'value'),
+        progress=[Output('wr-simulation-progress', 'value'), Output('wr-simulation-progress', 'max')],
+        cancel=Input('wr-simulation-cancel', 'n_clicks'),
+        running=[(Output('wr-simulation-run', 'disabled'), True, False),
+                 (Output('wr-simulation-cancel', 'disabled'), False, True)],
+        cache_args_to_ignore=[0],
+        prevent_initial_call=True)
+    def wr_simulate_seasons(set_progress, n_clicks, seasons, runs):
+        return analytics.simulate(wr_data.get()['frames']['player_stats'], 'player_display_name', seasons, runs,
+                                  lambda done, total: set_progress((str(done), str(total))))
+
+
+def wr_update_time_series(series, xaxis_column_name, yaxis_column_name, zaxis_column_name, base):
+    # the server side version of timeseries.draw; a new player redraws everything, an axis change only redraws its
+    # own time series
+    if not series:
+        raise PreventUpdate
+    player_name = series['player']
+    trigger = ctx.triggered_id
+    player_changed = trigger not in ('wr-crossfilter-xaxis-column', 'wr-crossfilter-yaxis-column', 'wr-crossfilter-zaxis-column')
+    x_figure = y_figure = z_figure = no_update
+    if player_changed or trigger == 'wr-crossfilter-xaxis-column':
+        title = '<b>{}</b><br>{}'.format(player_name, xaxis_column_name)
+        x_figure = wr_player_time_series(player_name, xaxis_column_name, title)
+    if player_changed or trigger == 'wr-crossfilter-yaxis-column':
+        y_figure = wr_player_time_series(player_name, yaxis_column_name, yaxis_column_name)
+    if player_changed or trigger == 'wr-crossfilter-zaxis-column':
+        z_figure = wr_player_time_series(player_name, zaxis_column_name, zaxis_column_name)
+    return x_figure, y_figure, z_figure
+
+
+wr_time_series_io = (
+    Output('wr-x-time-series', 'figure'),
+    Output('wr-y-time-series', 'figure'),
     Output('wr-z-time-series', 'figure'),
-    Input('wr-select-player-list', 'value'),
-    Input('wr-crossfilter-zaxis-column', 'value'))
-def wr_update_z_timeseries(hoverData, zaxis_column_name):
-    dff = player_stats[player_stats['player_display_name'] == hoverData]
-    dff = dff[dff['Category'] == zaxis_column_name]
-    return wr_create_time_series(dff, zaxis_column_name)
+    Input('wr-player-series', 'data'),
+    Input('wr-crossfilter-xaxis-column', 'value'),
+    Input('wr-crossfilter-yaxis-column', 'value'),
+    Input('wr-crossfilter-zaxis-column', 'value'),
+    State('wr-time-series-layout', 'data'))
 
+if figures.CLIENTSIDE_TIMESERIES:
+    clientside_callback(ClientsideFunction('timeseries', 'draw'), *wr_time_series_io)
+else:
+    callback(*wr_time_series_io)(wr_update_time_series)
 
 # if __name__ == "__main__":
 #     app.run_server(debug=True)
\ No newline at end of file
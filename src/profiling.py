@@ -0,0 +1,196 @@
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+# record wall time and memory for each stage of startup (imports, page registration, every page's data build) and
+# report them once the pages have loaded. off by default, when stage() and timed() cost nothing
+PROFILE = os.environ.get('FF_PROFILE_STARTUP', '0') != '0'
+
+# where the report is written as JSON; it goes to stderr when unset
+PROFILE_OUT = os.environ.get('FF_PROFILE_OUT')
+
+# cold start budget: startup taking longer (seconds) or peaking higher (MB of RSS) is logged as a warning, and
+# fails `python profiling.py`
+BUDGET_S = float(os.environ.get('FF_STARTUP_BUDGET_S', 0)) or None
+BUDGET_MB = float(os.environ.get('FF_STARTUP_BUDGET_MB', 0)) or None
+
+# seconds between the RSS samples a stage's peak is taken from
+SAMPLE_INTERVAL = 0.005
+
+started = time.perf_counter()
+records = []
+finished = threading.Event()
+# the report finish() emitted
+last_report = None
+
+_local = threading.local()
+_active = []
+_lock = threading.Lock()
+_sampler = None
+
+
+def rss():
+    # resident memory in bytes, falling back to the peak so far where /proc isn't there
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return peak_rss()
+
+
+def peak_rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _sample():
+    # the peak of a stage is the highest RSS seen while it ran, as ru_maxrss only has the peak of the whole process
+    while not finished.is_set():
+        current = rss()
+        with _lock:
+            for record in _active:
+                record['peak'] = max(record['peak'], current)
+        time.sleep(SAMPLE_INTERVAL)
+
+
+@contextmanager
+def stage(name):
+    # stages nest: a stage started inside another is recorded as 'outer/inner'
+    if not PROFILE:
+        yield
+        return
+
+    global _sampler
+    with _lock:
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample, name='profile-sampler', daemon=True)
+            _sampler.start()
+
+    stack = _local.__dict__.setdefault('stack', [])
+    stack.append(name)
+    before = rss()
+    record = {'stage': '/'.join(stack), 'thread': threading.current_thread().name,
+              'start_s': time.perf_counter() - started, 'before': before, 'peak': before}
+    with _lock:
+        _active.append(record)
+    try:
+        yield
+    finally:
+        after = rss()
+        stack.pop()
+        with _lock:
+            _active.remove(record)
+            record['peak'] = max(record['peak'], after)
+            records.append({
+                'stage': record['stage'],
+                'thread': record['thread'],
+                'start_s': round(record['start_s'], 4),
+                'wall_s': round(time.perf_counter() - started - record['start_s'], 4),
+                'rss_before_mb': round(before / 2 ** 20, 1),
+                'rss_after_mb': round(after / 2 ** 20, 1),
+                'peak_rss_mb': round(record['peak'] / 2 ** 20, 1),
+            })
+
+
+def timed(name):
+    # stage() as a decorator, for the steps of a build that are whole functions
+    def decorator(func):
+        if not PROFILE:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def report():
+    with _lock:
+        stages = sorted(records, key=lambda r: (r['start_s'], r['stage'].count('/')))
+    total_s = time.perf_counter() - started
+    peak_mb = max(peak_rss(), rss()) / 2 ** 20
+    over = []
+    if BUDGET_S is not None and total_s > BUDGET_S:
+        over.append('startup took {:.1f}s, over the {:g}s budget'.format(total_s, BUDGET_S))
+    if BUDGET_MB is not None and peak_mb > BUDGET_MB:
+        over.append('startup peaked at {:.0f}MB, over the {:g}MB budget'.format(peak_mb, BUDGET_MB))
+    return {
+        'pid': os.getpid(),
+        'total_s': round(total_s, 4),
+        'rss_mb': round(rss() / 2 ** 20, 1),
+        'peak_rss_mb': round(peak_mb, 1),
+        'budget': {'wall_s': BUDGET_S, 'rss_mb': BUDGET_MB, 'over': over},
+        'stages': stages,
+    }
+
+
+def finish():
+    # called once startup is over: after the app is imported, or after the warm up when there is one
+    global last_report
+    if not PROFILE or finished.is_set():
+        return None
+    result = last_report = report()
+    finished.set()
+    for problem in result['budget']['over']:
+        logger.warning(problem)
+    if PROFILE_OUT:
+        with open(PROFILE_OUT, 'w') as f:
+            json.dump(result, f, indent=2)
+    else:
+        sys.stderr.write('startup profile: {}\n'.format(json.dumps(result)))
+    return result
+
+
+def print_table(result):
+    print('{:<64} {:>8} {:>8} {:>10} {:>10} {:>10}'.format('stage', 'start s', 'wall s', 'RSS MB', 'peak MB',
+                                                         'delta MB'))
+    for r in result['stages']:
+        print('{:<64} {:>8.2f} {:>8.2f} {:>10.1f} {:>10.1f} {:>10.1f}'.format(
+            r['stage'], r['start_s'], r['wall_s'], r['rss_after_mb'], r['peak_rss_mb'],
+            r['rss_after_mb'] - r['rss_before_mb']))
+    print('total {:.2f}s, RSS {:.1f}MB, peak {:.1f}MB'.format(result['total_s'], result['rss_mb'],
+                                                            result['peak_rss_mb']))
+
+
+def main():
+    # boots the app the way a worker does, with every page warmed up, and prints where the time and memory went.
+    # exits non-zero when a budget is set and startup goes over it
+    parser = argparse.ArgumentParser(description='Profile the app\'s startup.')
+    parser.add_argument('--budget-s', type=float, help='fail if startup takes longer than this many seconds')
+    parser.add_argument('--budget-mb', type=float, help='fail if RSS peaks above this many MB during startup')
+    parser.add_argument('--out', help='also write the JSON report here')
+    parser.add_argument('--timeout', type=float, default=600, help='seconds to wait for the pages to load')
+    args = parser.parse_args()
+
+    os.environ.update({'FF_PROFILE_STARTUP': '1', 'FF_WARM_UP': '1', 'FF_REFRESH_INTERVAL': '0',
+                       'FF_PROFILE_OUT': args.out or os.devnull})
+    if args.budget_s:
+        os.environ['FF_STARTUP_BUDGET_S'] = str(args.budget_s)
+    if args.budget_mb:
+        os.environ['FF_STARTUP_BUDGET_MB'] = str(args.budget_mb)
+
+    # the app imports this file as the profiling module, which is the one that holds the records
+    import app  # noqa: F401
+    import profiling
+    if not profiling.finished.wait(args.timeout):
+        sys.exit('the pages had not loaded after {}s'.format(args.timeout))
+    result = profiling.last_report
+    print_table(result)
+    sys.exit(1 if result['budget']['over'] else 0)
+
+
+if __name__ == '__main__':
+    main()
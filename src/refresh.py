@@ -0,0 +1,105 @@
+import fcntl
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timezone
+
+import datastore
+
+logger = logging.getLogger(__name__)
+
+# seconds between in-season data refreshes; 0 (the default) leaves the data as it was at deploy
+REFRESH_INTERVAL = int(os.environ.get('FF_REFRESH_INTERVAL', 0))
+
+# seconds between checks for a snapshot written by another worker (or by running ingest.py by hand)
+RELOAD_INTERVAL = int(os.environ.get('FF_RELOAD_INTERVAL', 60))
+
+# held by whichever worker is running ingest, so a refresh only downloads the data once per instance
+LOCK_FILE = 'refresh.lock'
+
+# touched every time a worker checks for new weeks, found or not, so the next check waits a whole interval
+CHECKED_FILE = 'last_checked'
+
+
+def current_season(today=None):
+    # a season starts in September and its playoffs run into the next year
+    today = today or date.today()
+    return today.year if today.month >= 9 else today.year - 1
+
+
+def refresh_years():
+    # every season from the first one ingested to the current one, so seasons that started since the deploy are
+    # fetched too rather than leaving a gap before the current one
+    import ingest
+    return list(range(min(ingest.SEASONS), current_season() + 1))
+
+
+def snapshot_age(snapshot_dir=datastore.SNAPSHOT_DIR):
+    version = datastore.current_version(snapshot_dir)
+    if version is None:
+        return None
+    # versions written before they had microseconds have no fraction
+    written = datetime.strptime(version.split('.')[0], '%Y%m%dT%H%M%S').replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - written).total_seconds()
+
+
+def check_age(snapshot_dir=datastore.SNAPSHOT_DIR):
+    # seconds since any worker last checked for new weeks. before the first check, the age of the snapshot, so a
+    # freshly deployed one isn't downloaded again straight away
+    try:
+        return time.time() - os.path.getmtime(os.path.join(snapshot_dir, CHECKED_FILE))
+    except FileNotFoundError:
+        return snapshot_age(snapshot_dir)
+
+
+def ingest_if_due(snapshot_dir=datastore.SNAPSHOT_DIR, interval=REFRESH_INTERVAL):
+    # check for new weeks when nobody has for the interval, writing a new snapshot if there are any. the check is
+    # timed from the last one rather than from the snapshot, which doesn't change when there was nothing new (most
+    # of the week, and all off-season). the other workers find the lock taken or the check recent and pick any new
+    # snapshot up through reload instead
+    os.makedirs(snapshot_dir, exist_ok=True)
+    with open(os.path.join(snapshot_dir, LOCK_FILE), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        age = check_age(snapshot_dir)
+        if age is not None and age < interval:
+            return None
+
+        import ingest
+        years = refresh_years()
+        started = time.monotonic()
+        try:
+            version = ingest.update(years, snapshot_dir)[1]
+        finally:
+            # a failed download counts as a check too, so the workers don't retry it one after another
+            with open(os.path.join(snapshot_dir, CHECKED_FILE), 'w'):
+                pass
+        if version is None:
+            logger.info('no new weeks for %s (checked in %.1fs)', years, time.monotonic() - started)
+        else:
+            logger.info('wrote snapshot %s for %s in %.1fs', version, years, time.monotonic() - started)
+        return version
+
+
+def run(snapshot_dir=datastore.SNAPSHOT_DIR):
+    next_ingest = time.monotonic()
+    while True:
+        try:
+            if REFRESH_INTERVAL and time.monotonic() >= next_ingest:
+                next_ingest = time.monotonic() + REFRESH_INTERVAL
+                ingest_if_due(snapshot_dir)
+            datastore.reload(snapshot_dir)
+        except Exception:
+            # a failed download or build leaves the current snapshot serving; the next tick tries again
+            logger.exception('data refresh failed')
+        time.sleep(min(RELOAD_INTERVAL, REFRESH_INTERVAL or RELOAD_INTERVAL))
+
+
+def start(snapshot_dir=datastore.SNAPSHOT_DIR):
+    # runs in every worker, off the request path
+    thread = threading.Thread(target=run, args=(snapshot_dir,), name='refresh', daemon=True)
+    thread.start()
+    return thread
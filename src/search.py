@@ -0,0 +1,110 @@
+import os
+import re
+import unicodedata
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+
+# also match names that are spelled differently from what was typed (trigram similarity), after the prefix matches.
+# FF_FUZZY_SEARCH=0 leaves only the prefix matches
+FUZZY = os.environ.get('FF_FUZZY_SEARCH', '1') != '0'
+
+# names returned for one search
+LIMIT = 10
+
+# lowest share of the query's trigrams a name has to contain to be a fuzzy match
+FUZZY_THRESHOLD = 0.4
+
+
+def normalize(name):
+    # lower case without accents or punctuation, so 'A.J. Brown', 'aj brown' and 'AJ Brown' are the same
+    name = unicodedata.normalize('NFKD', str(name))
+    name = ''.join(c for c in name if not unicodedata.combining(c)).lower()
+    name = re.sub(r"[.'’]", '', name)
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', name).split())
+
+
+def trigrams(text):
+    padded = ' {} '.format(text)
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    # the players of a page for the search dropdown. every word of every name is kept in one sorted list so the names
+    # with a word starting with what was typed are a binary search away, and every trigram maps to the names that
+    # have it for fuzzy matches. weights (career points) rank the matches, so the players people look for come first
+    def __init__(self, names, weights=None):
+        self.names = list(names)
+        self.weights = np.zeros(len(self.names)) if weights is None else np.asarray(weights, dtype=np.float64)
+        normalized = [normalize(name) for name in self.names]
+
+        words = sorted((word, i) for i, name in enumerate(normalized) for word in set(name.split()))
+        self.words = [word for word, _ in words]
+        self.word_ids = np.array([i for _, i in words], dtype=np.int64)
+        full = sorted((name, i) for i, name in enumerate(normalized))
+        self.full = [name for name, _ in full]
+        self.full_ids = np.array([i for _, i in full], dtype=np.int64)
+
+        grams = {}
+        for i, name in enumerate(normalized):
+            for gram in trigrams(name):
+                grams.setdefault(gram, []).append(i)
+        self.grams = {gram: np.array(ids, dtype=np.int64) for gram, ids in grams.items()}
+
+    @staticmethod
+    def _prefixed(keys, ids, prefix):
+        return ids[bisect_left(keys, prefix):bisect_left(keys, prefix + '\uffff')]
+
+    def prefix_matches(self, query):
+        # names that start with the query, then names where every typed word starts one of the name's words
+        words = query.split()
+        matched = [np.unique(self._prefixed(self.words, self.word_ids, word)) for word in words]
+        every = matched[0]
+        for ids in matched[1:]:
+            every = np.intersect1d(every, ids, assume_unique=True)
+        starts = np.unique(self._prefixed(self.full, self.full_ids, query))
+        return starts, np.setdiff1d(every, starts, assume_unique=True)
+
+    def fuzzy_matches(self, query):
+        # names containing enough of the query's trigrams, as (ids, similarity), most similar first. what was typed
+        # is usually part of a name, so the similarity is the share of the query found in the name
+        query_grams = trigrams(query)
+        found = [self.grams[gram] for gram in query_grams if gram in self.grams]
+        if not found:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        similarity = np.bincount(np.concatenate(found), minlength=len(self.names)) / len(query_grams)
+        ids = np.flatnonzero(similarity >= FUZZY_THRESHOLD)
+        order = np.lexsort((-self.weights[ids], -similarity[ids]))
+        return ids[order], similarity[ids[order]]
+
+    def _ranked(self, ids):
+        return ids[np.lexsort((ids, -self.weights[ids]))]
+
+    def search(self, query, limit=LIMIT, fuzzy=FUZZY):
+        query = normalize(query)
+        if not query:
+            return []
+        starts, words = self.prefix_matches(query)
+        ids = np.concatenate([self._ranked(starts), self._ranked(words)])[:limit]
+        if fuzzy and len(ids) < limit:
+            close = self.fuzzy_matches(query)[0]
+            ids = np.concatenate([ids, close[~np.isin(close, ids)]])[:limit]
+        return [self.names[i] for i in ids]
+
+
+def player_index(names, df, column, weight='fantasy_points_ppr'):
+    # a NameIndex over the distinct names, each weighted by the player's total of a stat in df (0 for players not in
+    # it), so career points decide which of several matches comes first
+    names = pd.Series(pd.unique(names)).dropna().astype(str)
+    totals = df.groupby(column, observed=True)[weight].sum()
+    totals.index = totals.index.astype(str)
+    return NameIndex(names, totals.reindex(names).fillna(0).to_numpy())
+
+
+def options(names, value, search_value):
+    # the dropdown drops a value that isn't one of its options, so the current player always stays in them. the
+    # dropdown also filters its options by what was typed on its own, which would hide the fuzzy and normalized
+    # matches, so each match is searched by the text that found it
+    return ([value] if value and value not in names else []) + [
+        {'label': name, 'value': name, 'search': search_value} for name in names]
@@ -0,0 +1,295 @@
+import argparse
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# where ingest gets its data from. every source has nfl_data_py's import_weekly_data, import_seasonal_data and
+# import_players with the same arguments, columns and dtypes:
+#   nflverse                       nfl_data_py itself, downloading from nflverse (the default)
+#   fixture[:players=2,weeks=18]   deterministic synthetic data for any seasons, generated locally
+#   replay:<dir>                   files recorded from another source with `python sources.py`
+DATA_SOURCE = os.environ.get('FF_DATA_SOURCE', 'nflverse')
+
+_active = None
+
+
+class FixtureSource:
+    # realistic looking weekly stats generated from a seed, so the app, the benchmarks and load tests can run without
+    # the network, at any scale. players multiplies the players at each position, weeks is the regular season length.
+    # a season's data only depends on the seed and the season, not on which other seasons were asked for
+
+    # players per position with snaps in a season at players=1, roughly what nflverse has
+    ROSTER = {'QB': 75, 'RB': 145, 'WR': 225, 'TE': 115}
+
+    # players the pages open on, so their defaults have data in every season
+    STARS = {'QB': ['Patrick Mahomes'], 'RB': ['Derrick Henry', 'Josh Jacobs'], 'WR': ['Justin Jefferson'],
+             'TE': ['Travis Kelce']}
+
+    FIRST_NAMES = ['Aaron', 'Adrian', 'Alvin', 'Amari', 'Austin', 'Brandon', 'Calvin', 'Chris', 'Cooper', 'Dalvin',
+                   'Darren', 'David', 'DeAndre', 'Devin', 'Evan', 'George', 'Jalen', 'James', 'Jared', 'Joe',
+                   'Jonathan', 'Josh', 'Justin', 'Kenny', 'Kyle', 'Lamar', 'Marcus', 'Mark', 'Michael', 'Mike',
+                   'Nick', 'Ryan', 'Saquon', 'Stefon', 'Terry', 'Tony', 'Tyler', 'Tyreek', 'Will', 'Zach']
+    LAST_NAMES = ['Adams', 'Allen', 'Andrews', 'Brown', 'Carr', 'Chase', 'Cook', 'Davis', 'Diggs', 'Evans', 'Fields',
+                  'Goedert', 'Harris', 'Henderson', 'Hill', 'Hopkins', 'Jackson', 'Jones', 'Kittle', 'Lamb', 'Mack',
+                  'Miller', 'Mixon', 'Moore', 'Murray', 'Olave', 'Pitts', 'Robinson', 'Smith', 'Swift', 'Taylor',
+                  'Thomas', 'Waller', 'Walker', 'Waddle', 'White', 'Williams', 'Wilson', 'Wright', 'Young']
+
+    TEAMS = ['ARI', 'ATL', 'BAL', 'BUF', 'CAR', 'CHI', 'CIN', 'CLE', 'DAL', 'DEN', 'DET', 'GB', 'HOU', 'IND', 'JAX',
+             'KC', 'LA', 'LAC', 'LV', 'MIA', 'MIN', 'NE', 'NO', 'NYG', 'NYJ', 'PHI', 'PIT', 'SEA', 'SF', 'TB', 'TEN',
+             'WAS']
+
+    PASSING = ['completions', 'attempts', 'passing_yards', 'passing_tds', 'interceptions', 'sacks', 'sack_yards',
+               'sack_fumbles', 'passing_air_yards', 'passing_first_downs']
+    RUSHING = ['carries', 'rushing_yards', 'rushing_tds', 'rushing_fumbles', 'rushing_first_downs']
+    RECEIVING = ['receptions', 'targets', 'receiving_yards', 'receiving_tds', 'receiving_fumbles',
+                 'receiving_air_yards', 'receiving_yards_after_catch', 'receiving_first_downs']
+    STATS = PASSING + RUSHING + RECEIVING + ['fantasy_points', 'fantasy_points_ppr']
+
+    # mean attempts, carries and targets per game, by position
+    RATES = {
+        'QB': {'attempts': 33, 'carries': 4, 'targets': 0.05},
+        'RB': {'attempts': 0.02, 'carries': 12, 'targets': 3},
+        'WR': {'attempts': 0.01, 'carries': 0.3, 'targets': 6},
+        'TE': {'attempts': 0.0, 'carries': 0.05, 'targets': 4},
+    }
+
+    # draft classes are numbered from here, so names and ids don't depend on the seasons asked for
+    FIRST_CLASS = 1950
+    CAREER = 12
+    POSTSEASON_WEEKS = 4
+
+    def __init__(self, players=1.0, weeks=18, seed=20231):
+        self.players = float(players)
+        self.weeks = int(weeks)
+        self.seed = int(seed)
+        self._classes = {}
+
+    def __repr__(self):
+        return 'fixture:players={:g},weeks={},seed={}'.format(self.players, self.weeks, self.seed)
+
+    def _class_size(self, position):
+        # enough rookies a year that, with careers of 1-12 seasons, about 1.4 rosters' worth are active
+        return max(int(np.ceil(self.ROSTER[position] * self.players / 4)), 1)
+
+    def _draft_class(self, year, position):
+        # the players entering the league in a year at a position, with their career length and talent
+        key = (year, position)
+        if key not in self._classes:
+            positions = list(self.ROSTER)
+            rng = np.random.default_rng([self.seed, year, positions.index(position)])
+            size = self._class_size(position)
+            stride = max(self._class_size(p) for p in positions)
+            ids = ((year - self.FIRST_CLASS) * len(positions) + positions.index(position)) * stride + np.arange(size)
+            self._classes[key] = pd.DataFrame({
+                'display_name': [self._name(i) for i in ids],
+                'position': position,
+                'gsis_id': ['00-{:07d}'.format(i) for i in ids],
+                'team_abbr': np.array(self.TEAMS)[rng.integers(len(self.TEAMS), size=size)],
+                'first_season': year,
+                'last_season': year + rng.integers(0, self.CAREER, size=size),
+                'talent': rng.gamma(4, 0.25, size=size),
+            })
+        return self._classes[key]
+
+    def _name(self, i):
+        # every first and last name combination, then again with a middle initial (and a number past z), so every
+        # player id gets its own name
+        first = self.FIRST_NAMES[i % len(self.FIRST_NAMES)]
+        last = self.LAST_NAMES[i // len(self.FIRST_NAMES) % len(self.LAST_NAMES)]
+        k = i // (len(self.FIRST_NAMES) * len(self.LAST_NAMES))
+        if k == 0:
+            return '{} {}'.format(first, last)
+        initial = chr(ord('A') + (k - 1) % 26) + (str((k - 1) // 26) if k > 26 else '')
+        return '{} {}. {}'.format(first, initial, last)
+
+    def _stars(self):
+        rows = []
+        for position, names in self.STARS.items():
+            for name in names:
+                rows.append({'display_name': name, 'position': position, 'gsis_id': '00-9{:06d}'.format(len(rows)),
+                             'team_abbr': self.TEAMS[len(rows) * 7 % len(self.TEAMS)], 'first_season': 0,
+                             'last_season': 9999, 'talent': 1.25})
+        return pd.DataFrame(rows)
+
+    def _active(self, season, position):
+        classes = [self._draft_class(year, position) for year in range(season - self.CAREER + 1, season + 1)]
+        stars = self._stars()
+        players = pd.concat([stars[stars['position'] == position]] + classes, ignore_index=True)
+        players = players[players['last_season'] >= season]
+        # the best players at each position get the snaps
+        return players.nlargest(max(int(self.ROSTER[position] * self.players), 1), 'talent')
+
+    def _season(self, season):
+        frames = []
+        for position in sorted(self.ROSTER):
+            rng = np.random.default_rng([self.seed, season, list(self.ROSTER).index(position)])
+            group = self._active(season, position)
+            weeks = np.arange(1, self.weeks + self.POSTSEASON_WEEKS + 1)
+            played = rng.random((len(group), len(weeks))) < 0.82
+            # only some teams make the playoffs
+            played[:, self.weeks:] &= (rng.random((len(group), 1)) < 0.35)
+            player_index, week_index = np.nonzero(played)
+            talent = group['talent'].to_numpy()[player_index]
+            rates = self.RATES[position]
+            n = len(player_index)
+
+            def counts(mean):
+                return rng.poisson(mean * talent).astype(np.float64)
+
+            d = {}
+            d['attempts'] = counts(rates['attempts'])
+            d['completions'] = np.floor(d['attempts'] * rng.uniform(0.55, 0.72, n))
+            d['passing_yards'] = np.round(d['completions'] * rng.normal(11, 2.5, n))
+            d['passing_tds'] = counts(rates['attempts'] * 0.045)
+            d['interceptions'] = counts(rates['attempts'] * 0.022)
+            d['sacks'] = counts(rates['attempts'] * 0.07)
+            d['sack_yards'] = d['sacks'] * 7
+            d['sack_fumbles'] = counts(rates['attempts'] * 0.004)
+            d['passing_air_yards'] = np.round(d['attempts'] * rng.normal(8, 1.5, n))
+            d['passing_first_downs'] = np.floor(d['completions'] * 0.5)
+            d['carries'] = counts(rates['carries'])
+            d['rushing_yards'] = np.round(d['carries'] * rng.normal(4.3, 1.5, n))
+            d['rushing_tds'] = counts(rates['carries'] * 0.035)
+            d['rushing_fumbles'] = counts(rates['carries'] * 0.008)
+            d['rushing_first_downs'] = np.floor(d['carries'] * 0.25)
+            d['targets'] = counts(rates['targets'])
+            d['receptions'] = np.floor(d['targets'] * rng.uniform(0.55, 0.8, n))
+            d['receiving_yards'] = np.round(d['receptions'] * rng.normal(11.5, 3, n))
+            d['receiving_tds'] = counts(rates['targets'] * 0.05)
+            d['receiving_fumbles'] = counts(rates['targets'] * 0.003)
+            d['receiving_air_yards'] = np.round(d['targets'] * rng.normal(9, 3, n))
+            d['receiving_yards_after_catch'] = np.round(d['receptions'] * rng.normal(4.5, 1.5, n))
+            d['receiving_first_downs'] = np.floor(d['receptions'] * 0.5)
+            d['fantasy_points'] = (d['passing_yards'] * 0.04 + d['passing_tds'] * 4 - d['interceptions'] * 2
+                                   + d['rushing_yards'] * 0.1 + d['rushing_tds'] * 6 + d['receiving_yards'] * 0.1
+                                   + d['receiving_tds'] * 6 - (d['rushing_fumbles'] + d['receiving_fumbles']) * 2)
+            d['fantasy_points_ppr'] = d['fantasy_points'] + d['receptions']
+
+            week = weeks[week_index]
+            frames.append(pd.DataFrame({
+                'player_id': group['gsis_id'].to_numpy()[player_index],
+                'player_name': group['display_name'].to_numpy()[player_index],
+                'player_display_name': group['display_name'].to_numpy()[player_index],
+                'position': position,
+                'position_group': position,
+                'headshot_url': None,
+                'recent_team': group['team_abbr'].to_numpy()[player_index],
+                'season': season,
+                'week': week,
+                'season_type': np.where(week <= self.weeks, 'REG', 'POST'),
+                'opponent_team': np.array(self.TEAMS)[rng.integers(len(self.TEAMS), size=n)],
+                **{stat: d[stat] for stat in self.STATS},
+            }))
+        return pd.concat(frames, ignore_index=True)
+
+    def import_weekly_data(self, years, columns=None, downcast=True):
+        weekly = pd.concat([self._season(season) for season in years], ignore_index=True)
+        weekly = weekly.sort_values(['season', 'week', 'player_id'], ignore_index=True)
+        weekly['season'] = weekly['season'].astype(np.int32)
+        weekly['week'] = weekly['week'].astype(np.int32)
+        if downcast:
+            weekly[self.STATS] = weekly[self.STATS].astype(np.float32)
+        return weekly[columns] if columns else weekly
+
+    def import_seasonal_data(self, years, s_type='REG'):
+        weekly = self.import_weekly_data(years, downcast=False)
+        weekly = weekly[weekly['season_type'] == s_type]
+        seasonal = weekly.groupby(['player_id', 'season'], as_index=False)[self.STATS].sum()
+        seasonal['games'] = weekly.groupby(['player_id', 'season']).size().to_numpy()
+        seasonal['season_type'] = s_type
+        return seasonal
+
+    def import_players(self):
+        # every player in the draft classes generated so far, or up to next year if nothing has been
+        for year in range(1990, date.today().year + 2):
+            for position in self.ROSTER:
+                self._draft_class(year, position)
+        players = pd.concat([self._stars()] + list(self._classes.values()), ignore_index=True)
+        return players[['display_name', 'position', 'gsis_id', 'team_abbr']].assign(status='ACT')
+
+
+class ReplaySource:
+    # data recorded from another source (see record), one file per season, so a real download can be replayed
+    # offline and exactly
+    def __init__(self, directory):
+        self.directory = directory
+
+    def __repr__(self):
+        return 'replay:{}'.format(self.directory)
+
+    def _read(self, name):
+        path = os.path.join(self.directory, name + '.feather')
+        if not os.path.exists(path):
+            raise FileNotFoundError('{} has no recording of {}; record it with `python sources.py`'.format(
+                self.directory, name))
+        return pd.read_feather(path)
+
+    def import_weekly_data(self, years, columns=None, downcast=True):
+        weekly = pd.concat([self._read('weekly_{}'.format(year)) for year in years], ignore_index=True)
+        if downcast:
+            # the same downcast nfl_data_py does
+            floats = weekly.select_dtypes(np.float64).columns
+            weekly[floats] = weekly[floats].astype(np.float32)
+        return weekly[columns] if columns else weekly
+
+    def import_seasonal_data(self, years, s_type='REG'):
+        seasonal = pd.concat([self._read('seasonal_{}'.format(year)) for year in years], ignore_index=True)
+        return seasonal[seasonal['season_type'] == s_type] if 'season_type' in seasonal else seasonal
+
+    def import_players(self):
+        return self._read('players')
+
+
+def record(source, years, directory):
+    # save what a source returns for the seasons, in the layout ReplaySource reads
+    os.makedirs(directory, exist_ok=True)
+    for year in years:
+        source.import_weekly_data([year], downcast=False).reset_index(drop=True).to_feather(
+            os.path.join(directory, 'weekly_{}.feather'.format(year)))
+        source.import_seasonal_data([year]).reset_index(drop=True).to_feather(
+            os.path.join(directory, 'seasonal_{}.feather'.format(year)))
+    source.import_players().reset_index(drop=True).to_feather(os.path.join(directory, 'players.feather'))
+
+
+def get(spec=DATA_SOURCE):
+    # a source from its name and options, e.g. 'nflverse', 'fixture:players=4,weeks=17' or 'replay:/data/nfl'
+    name, _, options = spec.partition(':')
+    if name == 'nflverse':
+        import nfl_data_py
+        return nfl_data_py
+    if name == 'fixture':
+        return FixtureSource(**dict(option.split('=', 1) for option in options.split(',') if option))
+    if name == 'replay':
+        return ReplaySource(options)
+    raise ValueError('unknown data source {!r}'.format(spec))
+
+
+def active():
+    global _active
+    if _active is None:
+        _active = get()
+    return _active
+
+
+def use(source):
+    # switch the source ingest reads from, by spec or as a source object
+    global _active
+    _active = get(source) if isinstance(source, str) else source
+    return _active
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record a data source to files that `replay:<dir>` can serve offline.')
+    parser.add_argument('--years', type=int, nargs='+', required=True, help='seasons to record')
+    parser.add_argument('--source', default=DATA_SOURCE, help='source to record from')
+    parser.add_argument('--out', required=True, help='directory to write the recording to')
+    args = parser.parse_args()
+
+    record(get(args.source), args.years, args.out)
+    print('recorded {} for {} to {}'.format(args.source, args.years, args.out))
+
+
+if __name__ == '__main__':
+    main()